@@ -0,0 +1,61 @@
+"""One benchmark case. Runs in a separate process, so its peak RSS is measured alone.
+
+Usage: python -m benchmarks.case '{"engine": "api", "src": "...", "workdir": "...", "memory_limit": ...}'
+Prints stats of sorting as JSON.
+"""
+import sys
+import json
+import time
+import subprocess
+from pathlib import Path
+
+from diskcsvsort import CSVSort
+
+
+def run_api(src: Path, workdir: Path, memory_limit: float) -> dict:
+    csvsort = CSVSort(
+        src=src,
+        key=lambda row: int(row['key']),
+        workdir=workdir,
+        memory_limit=memory_limit,
+    )
+    return csvsort.apply().to_dict()
+
+
+def run_cli(src: Path, workdir: Path, memory_limit: float) -> dict:
+    """Sort by CLI process. Wall time is measured end-to-end, so it includes startup of interpreter,
+    imports and parsing of options. Wall time of sorting itself is ``sort_wall_time``."""
+    stats_path = workdir / 'stats.json'
+    wall_time = time.perf_counter()
+    subprocess.run(
+        [
+            sys.executable, '-m', 'diskcsvsort', str(src),
+            '--by', 'key:int',
+            '--memory-limit', str(memory_limit),
+            '--workdir', str(workdir),
+            '--stats-json', str(stats_path),
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    wall_time = time.perf_counter() - wall_time
+    stats = json.loads(stats_path.read_text())
+    return stats | {'wall_time': wall_time, 'sort_wall_time': stats['wall_time']}
+
+
+ENGINES = {
+    'api': run_api,
+    'cli': run_cli,
+}
+
+
+def main(spec: dict) -> dict:
+    return ENGINES[spec['engine']](
+        src=Path(spec['src']),
+        workdir=Path(spec['workdir']),
+        memory_limit=spec['memory_limit'],
+    )
+
+
+if __name__ == '__main__':
+    print(json.dumps(main(json.loads(sys.argv[1]))))
@@ -0,0 +1,45 @@
+"""Compare two benchmark results.
+
+Usage: python -m benchmarks.compare old.json new.json
+Exit code is 1 if any case got slower more than threshold.
+"""
+import json
+from pathlib import Path
+
+import typer
+
+CASE_FIELDS = ('engine', 'shape', 'rows', 'memory_limit')
+
+
+def load(path: Path) -> dict[tuple, dict]:
+    results = json.loads(path.read_text())['results']
+    return {tuple(result[field] for field in CASE_FIELDS): result for result in results}
+
+
+def compare(
+    old: Path = typer.Argument(..., exists=True, help='Baseline results.'),
+    new: Path = typer.Argument(..., exists=True, help='New results.'),
+    threshold: float = typer.Option(0.1, help='Allowed slowdown. 0.1 is 10%.'),
+):
+    old_results, new_results = load(old), load(new)
+    regressions = 0
+    for case, new_result in new_results.items():
+        old_result = old_results.get(case)
+        if old_result is None or not old_result['rows_per_sec'] or not new_result['rows_per_sec']:
+            continue
+        ratio = new_result['rows_per_sec'] / old_result['rows_per_sec']
+        regressed = ratio < 1 - threshold
+        regressions += regressed
+        engine, shape, rows, memory_limit = case
+        typer.echo(
+            f'{engine:>4} {shape:>16} {rows:>10} {int(memory_limit):>10} B: '
+            f'{ratio:6.2f}x rows/s, '
+            f'peak RSS {new_result["peak_rss"] - old_result["peak_rss"]:+} B, '
+            f'temp {new_result["temp_bytes_written"] - old_result["temp_bytes_written"]:+} B'
+            f'{"  REGRESSION" if regressed else ""}'
+        )
+    raise typer.Exit(code=1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    typer.run(compare)
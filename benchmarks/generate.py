@@ -0,0 +1,64 @@
+"""Synthetic CSV files for benchmarks"""
+import csv
+import random
+import string
+import dataclasses
+from pathlib import Path
+
+
+@dataclasses.dataclass(frozen=True)
+class Shape:
+    """Shape of synthetic CSV file
+
+    :param rows: count of rows
+    :param width: count of payload columns besides the key column
+    :param cardinality: count of distinct keys
+    :param presorted: fraction of rows that are already in sorted order
+    :param duplicates: fraction of rows that are copies of previous rows
+    :param value_size: length of payload values
+    """
+    rows: int = 100_000
+    width: int = 3
+    cardinality: int = 1_000_000
+    presorted: float = 0.0
+    duplicates: float = 0.0
+    value_size: int = 10
+
+
+SHAPES = {
+    'random': Shape(),
+    'presorted': Shape(presorted=0.9),
+    'low_cardinality': Shape(cardinality=100),
+    'duplicates': Shape(duplicates=0.5),
+    'wide': Shape(width=20),
+}
+
+
+def header(shape: Shape) -> list[str]:
+    return ['key', *(f'col{i}' for i in range(shape.width))]
+
+
+def generate_csv(path: Path, shape: Shape, seed: int = 0) -> None:
+    """Write CSV file of the shape. The same seed gives the same file."""
+    rnd = random.Random(seed)
+
+    keys = [rnd.randrange(shape.cardinality) for _ in range(shape.rows)]
+    keys.sort()
+    shuffled = [i for i in range(shape.rows) if rnd.random() >= shape.presorted]
+    values = [keys[i] for i in shuffled]
+    rnd.shuffle(values)
+    for i, value in zip(shuffled, values):
+        keys[i] = value
+
+    alphabet = string.ascii_letters + string.digits
+    with path.open('w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(header(shape))
+        row: list = []
+        for key in keys:
+            if not row or rnd.random() >= shape.duplicates:
+                row = [
+                    key,
+                    *(''.join(rnd.choices(alphabet, k=shape.value_size)) for _ in range(shape.width)),
+                ]
+            writer.writerow(row)
@@ -0,0 +1,118 @@
+"""Benchmarks of CSVSort.apply() and CLI over input shapes and memory limits.
+
+Usage: python -m benchmarks.run --rows 100000 --output results.json
+"""
+import os
+import sys
+import json
+import shutil
+import platform
+import tempfile
+import dataclasses
+import subprocess
+from pathlib import Path
+from importlib import metadata
+
+import typer
+
+from benchmarks.generate import SHAPES, generate_csv
+from benchmarks.case import ENGINES
+
+MEMORY_LIMITS = (1024 * 1024, 10 * 1024 * 1024, 300 * 1024 * 1024)
+
+
+def run_case(engine: str, src: Path, memory_limit: float, workdir: Path) -> dict:
+    """Sort copy of src in a separate process and measure it"""
+    shutil.rmtree(workdir, ignore_errors=True)
+    workdir.mkdir(parents=True)
+    dest = workdir / src.name
+    shutil.copyfile(src, dest)
+
+    spec = {'engine': engine, 'src': str(dest), 'workdir': str(workdir), 'memory_limit': memory_limit}
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.case', json.dumps(spec)],
+        stdout=subprocess.PIPE,
+    )
+    output = proc.stdout.read()
+    proc.stdout.close()
+    # wait4 gives peak RSS of the case process and of its children
+    _, status, rusage = os.wait4(proc.pid, 0)
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise RuntimeError(f'Benchmark case failed: {spec}')
+    stats = json.loads(output)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    bytes_read = sum(phase['bytes_read'] for phase in stats['phases'].values())
+    return {
+        'rows': stats['rows'],
+        'bytes': stats['bytes'],
+        'wall_time': stats['wall_time'],
+        'cpu_time': stats['cpu_time'],
+        'rows_per_sec': stats['rows'] / stats['wall_time'] if stats['wall_time'] else None,
+        # ru_maxrss is in KiB on Linux and in bytes on macOS
+        'peak_rss': rusage.ru_maxrss if platform.system() == 'Darwin' else rusage.ru_maxrss * 1024,
+        'temp_bytes_written': stats['temp_bytes_written'],
+        'temp_bytes_peak': stats['temp_bytes_peak'],
+        'runs': stats['runs'],
+        'max_depth': stats['max_depth'],
+        'passes': bytes_read / stats['bytes'] if stats['bytes'] else 0,
+    }
+
+
+def metadata_info() -> dict:
+    try:
+        version = metadata.version('diskcsvsort')
+    except metadata.PackageNotFoundError:
+        version = 'unknown'
+    return {
+        'diskcsvsort': version,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run(
+    rows: int = typer.Option(100_000, help='Rows of generated CSV files.'),
+    shape: list[str] = typer.Option(list(SHAPES), help=f'Input shapes: {", ".join(SHAPES)}.'),
+    memory_limit: list[float] = typer.Option(list(MEMORY_LIMITS), help='Memory limits in bytes.'),
+    engine: list[str] = typer.Option(list(ENGINES), help=f'Engines: {", ".join(ENGINES)}.'),
+    repeat: int = typer.Option(1, help='Repeat every case and keep the fastest one.'),
+    seed: int = typer.Option(0, help='Seed of generated CSV files.'),
+    output: Path = typer.Option(Path('benchmark.json'), help='JSON file with results.'),
+):
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        for shape_name in shape:
+            case_shape = dataclasses.replace(SHAPES[shape_name], rows=rows)
+            src = tmpdir / f'{shape_name}.csv'
+            generate_csv(src, case_shape, seed=seed)
+
+            for engine_name in engine:
+                for limit in memory_limit:
+                    measures = [
+                        run_case(engine_name, src, limit, workdir=tmpdir / 'work')
+                        for _ in range(repeat)
+                    ]
+                    result = {
+                        'engine': engine_name,
+                        'shape': shape_name,
+                        **dataclasses.asdict(case_shape),
+                        'memory_limit': limit,
+                        **min(measures, key=lambda measure: measure['wall_time']),
+                    }
+                    results.append(result)
+                    typer.echo(
+                        f'{engine_name:>4} {shape_name:>16} {int(limit):>10} B: '
+                        f'{result["rows_per_sec"] or 0:>10.0f} rows/s, '
+                        f'peak RSS {result["peak_rss"]} B, temp {result["temp_bytes_written"]} B, '
+                        f'passes {result["passes"]:.1f}'
+                    )
+
+    output.write_text(json.dumps({'meta': metadata_info(), 'results': results}, indent=2))
+    typer.echo(f'Results have been saved: {output}')
+
+
+if __name__ == '__main__':
+    typer.run(run)
@@ -1,2 +1,4 @@
 from . import errors
 from .csvsort import CSVSort
+from .index import KeyIndex, read_range
+from .stats import PhaseEvent, SortStats
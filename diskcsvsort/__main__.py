@@ -1,7 +1,25 @@
+import sys
+from pathlib import Path
+
 import typer
 
-from diskcsvsort.cli import cli_run
+from diskcsvsort.cli import cli_run, cli_range, cli_batch
+
+COMMANDS = {
+    'range': cli_range,
+    'batch': cli_batch,
+}
+
+
+def main():
+    """Sort CSV files, or run a command if the first argument is its name (and not a file)"""
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command in COMMANDS and not Path(command).exists():
+        del sys.argv[1]
+        typer.run(COMMANDS[command])
+    else:
+        typer.run(cli_run)
 
 
 if __name__ == '__main__':
-    typer.run(cli_run)
+    main()
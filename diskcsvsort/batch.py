@@ -0,0 +1,64 @@
+"""Sorting of many CSV files in one process or a pool of worker processes.
+
+Startup of process, imports and parsing of key options are paid once for all files,
+so small files take a few milliseconds each.
+"""
+import csv
+import dataclasses
+from pathlib import Path
+from functools import partial
+from typing import Any, Callable, Iterable, Iterator
+
+from diskcsvsort import errors
+from diskcsvsort.csvsort import CSVSort
+from diskcsvsort.stats import SortStats
+
+
+@dataclasses.dataclass
+class BatchResult:
+    path: Path
+    stats: SortStats | None = None
+    error: str | None = None
+
+
+def sort_files(
+    paths: Iterable[Path],
+    *,
+    key: Callable[[dict], Any],
+    workers: int = 1,
+    chunksize: int = 16,
+    **options: Any,
+) -> Iterator[BatchResult]:
+    """Sort every CSV file in place. Files are distributed between worker processes.
+    Errors of files are returned in results, so one bad file does not stop the others.
+
+    :param paths: CSV file paths
+    :param key: sorting key function. It must be picklable if there are a few workers.
+    :param workers: count of processes that sort files, every file is sorted by one process
+    :param chunksize: count of files that are sent to a worker at once
+    :param options: other arguments of ``CSVSort``, e.g. ``memory_limit``
+    :return: results in order of paths
+    """
+    if workers < 1:
+        raise ValueError(f'workers must be positive: {workers}')
+
+    sort_file = partial(_sort_file, key=key, options=options)
+    if workers == 1:
+        yield from map(sort_file, paths)
+        return
+
+    # multiprocessing is imported only when it is needed, it takes a while
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(sort_file, paths, chunksize=chunksize)
+
+
+def _sort_file(path: Path, key: Callable[[dict], Any], options: dict) -> BatchResult:
+    try:
+        stats = CSVSort(src=path, key=key, **options).apply()
+    except (errors.CSVSortError, OSError) as err:
+        return BatchResult(path=path, error=str(err))
+    except (ValueError, KeyError, csv.Error) as err:
+        # bad data: wrong encoding (UnicodeDecodeError), broken CSV, missing column or value of key
+        return BatchResult(path=path, error=f'{type(err).__name__}: {err}')
+    return BatchResult(path=path, stats=stats)
@@ -0,0 +1,103 @@
+"""Manifest of resumable sorting job.
+
+Manifest is a JSON file in workdir that records finished runs of every segment of source files
+and runs of the merge in progress. It is written to a temporary file, flushed to the disk
+and renamed over the old one, so after a crash it holds either the old or the new state.
+Runs are flushed to the disk before they are recorded.
+"""
+import os
+import json
+import hashlib
+import platform
+import dataclasses
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+from diskcsvsort.chunks import Segment
+from diskcsvsort.enums import OS
+
+_VERSION = 1
+
+
+def fsync(path: Path) -> None:
+    """Flush file or directory to the disk"""
+    if path.is_dir() and platform.system() == OS.WINDOWS:
+        # directories can not be opened on Windows, renames are durable there anyway
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def job_id(sources: Sequence[Path], dest: Path) -> str:
+    """Id of sorting job: the same for the same source files and dest"""
+    paths = [str(Path(path).resolve()) for path in (*sources, dest)]
+    return hashlib.sha1(json.dumps(paths).encode()).hexdigest()[:16]
+
+
+def describe_job(sources: Sequence[Path], **options: Any) -> dict:
+    """Description of sorting job that has to match to resume it.
+    Source files are described by size and modification time, so changed files are sorted again."""
+    return {
+        'version': _VERSION,
+        'sources': [[str(path), path.stat().st_size, path.stat().st_mtime_ns] for path in sources],
+        **options,
+    }
+
+
+def segment_id(segment: Segment) -> str:
+    return f'{segment.path}:{segment.start}:{segment.end}'
+
+
+@dataclasses.dataclass
+class Manifest:
+    path: Path
+    job: dict
+    # finished runs of segments by segment_id
+    segments: dict[str, list[str]] = dataclasses.field(default_factory=dict)
+    # runs of the merge in progress, segments are not needed when it is set
+    merge: list[str] | None = None
+
+    @classmethod
+    def load(cls, path: Path) -> Optional['Manifest']:
+        """Load manifest. None if there is no manifest or it is not readable"""
+        try:
+            data = json.loads(path.read_text(encoding='utf-8'))
+            return cls(path=path, job=data['job'], segments=data['segments'], merge=data['merge'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self) -> None:
+        data = {'job': self.job, 'segments': self.segments, 'merge': self.merge}
+        temp_path = self.path.with_name(f'{self.path.name}.tmp')
+        with temp_path.open('w', encoding='utf-8') as file:
+            json.dump(data, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.path)
+        fsync(self.path.parent)
+
+    def delete(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+    def runs(self) -> list[Path]:
+        """All recorded runs"""
+        if self.merge is not None:
+            return [Path(run) for run in self.merge]
+        return [Path(run) for runs in self.segments.values() for run in runs]
+
+    def segment_runs(self, segment: Segment) -> list[Path] | None:
+        """Finished runs of segment. None if segment is not finished"""
+        runs = self.segments.get(segment_id(segment))
+        return None if runs is None else [Path(run) for run in runs]
+
+    def add_segment(self, segment: Segment, runs: Sequence[Path]) -> None:
+        self.segments[segment_id(segment)] = [str(run) for run in runs]
+        self.save()
+
+    def set_merge(self, runs: Sequence[Path]) -> None:
+        self.segments = {}
+        self.merge = [str(run) for run in runs]
+        self.save()
@@ -0,0 +1,160 @@
+"""Split CSV file to byte ranges of whole records, so ranges can be parsed independently.
+
+A record may contain new lines in quoted fields, so a boundary can not be taken
+at the first new line after an arbitrary offset. Quotes before every offset are counted
+(in parallel, range by range), and parity of quotes tells if the offset is inside quotes.
+Then the boundary is moved to the first new line outside quotes.
+Doubled quotes inside quoted fields change parity twice, so they do not break it.
+"""
+import csv
+import codecs
+import dataclasses
+from pathlib import Path
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Iterable, Iterator
+
+_QUOTE = b'"'
+_NEWLINE = b'\n'
+_BLOCK_SIZE = 1024 * 1024
+
+
+@dataclasses.dataclass(frozen=True)
+class Segment:
+    """Part of CSV file: byte range of whole records without header.
+    Segment without range is the whole file with header."""
+    path: Path
+    start: int | None = None
+    end: int | None = None
+
+    @property
+    def size(self) -> int:
+        if self.start is None:
+            return self.path.stat().st_size
+        return self.end - self.start
+
+
+def is_splittable(encoding: str) -> bool:
+    """Check if quotes and new lines are single bytes that can not be a part of another character"""
+    return codecs.lookup(encoding).name in ('utf-8', 'utf-8-sig', 'ascii', 'iso8859-1', 'iso8859-15', 'cp1252')
+
+
+def count_quotes(path: Path, start: int, end: int) -> int:
+    """Count quotes in byte range of file"""
+    quotes = 0
+    with path.open('rb') as file:
+        file.seek(start)
+        left = end - start
+        while left > 0:
+            block = file.read(min(_BLOCK_SIZE, left))
+            if not block:
+                break
+            quotes += block.count(_QUOTE)
+            left -= len(block)
+    return quotes
+
+
+def find_record_start(file: BinaryIO, offset: int, in_quotes: bool) -> int:
+    """Offset of the first record that starts at or after offset
+
+    :param file: CSV file opened in binary mode
+    :param offset: offset to search from
+    :param in_quotes: whether offset is inside quoted field
+    """
+    if offset > 0 and not in_quotes:
+        file.seek(offset - 1)
+        if file.read(1) == _NEWLINE:
+            return offset
+
+    file.seek(offset)
+    base = offset
+    while True:
+        block = file.read(_BLOCK_SIZE)
+        if not block:
+            return base
+
+        pos = 0
+        while True:
+            if in_quotes:
+                quote = block.find(_QUOTE, pos)
+                if quote < 0:
+                    break
+                in_quotes, pos = False, quote + 1
+            else:
+                newline = block.find(_NEWLINE, pos)
+                quote = block.find(_QUOTE, pos)
+                if newline >= 0 and (quote < 0 or newline < quote):
+                    return base + newline + 1
+                if quote < 0:
+                    break
+                in_quotes, pos = True, quote + 1
+        base += len(block)
+
+
+def read_header(path: Path, encoding: str) -> tuple[list[str], int]:
+    """Read header of CSV file and offset of the first record
+
+    :raise ValueError: if there is no header
+    """
+    with path.open('rb') as file:
+        header_end = find_record_start(file, 0, in_quotes=False)
+        file.seek(0)
+        header = next(csv.reader([file.read(header_end).decode(encoding)]), None)
+    if header is None:
+        raise ValueError(f'CSV file has no header: {path}')
+    return header, header_end
+
+
+def split_csv(
+    path: Path,
+    count: int,
+    encoding: str,
+    min_size: int = 0,
+    map_: Callable[..., Iterable] = map,
+) -> list[Segment]:
+    """Split CSV file to ``count`` segments of whole records at most.
+
+    :param path: CSV file path
+    :param count: max count of segments
+    :param encoding: encoding of CSV file
+    :param min_size: min size of segment in bytes
+    :param map_: map function that counts quotes of ranges, e.g. ``ProcessPoolExecutor.map``
+    :return: non-empty segments in order of file
+    """
+    _, header_end = read_header(path, encoding)
+    size = path.stat().st_size
+    count = max(1, min(count, (size - header_end) // max(min_size, 1)))
+    offsets = [header_end + i * (size - header_end) // count for i in range(count + 1)]
+
+    quotes = list(map_(count_quotes, [path] * count, offsets[:-1], offsets[1:]))
+    boundaries = [header_end]
+    with path.open('rb') as file:
+        parity = 0
+        for offset, range_quotes in zip(offsets[1:-1], quotes):
+            parity = (parity + range_quotes) % 2
+            boundaries.append(max(boundaries[-1], find_record_start(file, offset, in_quotes=bool(parity))))
+    boundaries.append(size)
+
+    return [
+        Segment(path=path, start=start, end=end)
+        for start, end in zip(boundaries, boundaries[1:])
+        if start < end
+    ]
+
+
+@contextmanager
+def open_segment(segment: Segment, encoding: str) -> Iterator[Iterator[str]]:
+    """Open lines of segment for ``csv.reader``"""
+    with segment.path.open('rb') as file:
+        yield _iter_lines(file, segment.start, segment.end, encoding)
+
+
+def _iter_lines(file: BinaryIO, start: int, end: int, encoding: str) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder(encoding)()
+    file.seek(start)
+    pos = start
+    while pos < end:
+        line = file.readline(end - pos)
+        if not line:
+            break
+        pos += len(line)
+        yield decoder.decode(line, final=pos >= end)
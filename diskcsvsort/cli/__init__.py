@@ -1 +1,25 @@
-from .diskcsvsort_cli import CLIError, CSVSortCLI, ALL_COLUMNS, cli_run
+"""Command line interface of diskcsvsort.
+
+Names are imported from modules on first use, so worker processes that unpickle
+column keys of ``cli.columns`` do not import typer.
+"""
+import importlib
+
+_EXPORTS = {
+    'CLIError': 'diskcsvsort_cli',
+    'CSVSortCLI': 'diskcsvsort_cli',
+    'ALL_COLUMNS': 'diskcsvsort_cli',
+    'cli_run': 'diskcsvsort_cli',
+    'cli_range': 'diskcsvsort_cli',
+    'cli_batch': 'diskcsvsort_cli',
+    'expand_sources': 'diskcsvsort_cli',
+    'read_paths': 'diskcsvsort_cli',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    return getattr(importlib.import_module(f'.{_EXPORTS[name]}', __name__), name)
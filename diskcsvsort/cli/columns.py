@@ -1,7 +1,24 @@
 import re
+import math
+import struct
+import functools
 import datetime as dt
 from abc import abstractmethod, ABC
-from typing import Pattern, Any, Type
+from typing import Pattern, Any, Type, Iterable, Callable, Collection
+
+from diskcsvsort.enums import ColumnOption
+from diskcsvsort.stats import CacheStats
+
+# the first byte of encoded value, it places values that can not be converted (nulls)
+# before or after other values
+NULL_RANK = b'\x00'
+VALUE_RANK = b'\x01'
+NULL_LAST_RANK = b'\x02'
+
+_INVERT = bytes(range(255, -1, -1))
+
+_EPOCH = dt.datetime(1970, 1, 1)
+_SIGN_BIT = 1 << 63
 
 
 class BaseColumn(ABC):
@@ -12,17 +29,92 @@ class BaseColumn(ABC):
 
     __columns__: dict[Pattern, Type['BaseColumn']] = {}
 
-    def __init__(self, parameter: str | None = None):
+    # max count of values in cache of cached column, the least recently used ones are evicted
+    cache_size = 64 * 1024
+
+    def __init__(
+        self,
+        parameter: str | None = None,
+        descending: bool = False,
+        nulls_last: bool | None = None,
+        cached: bool = False,
+    ):
+        """
+        :param parameter: parameter of type, e.g. format of datetime
+        :param descending: encode values in descending order
+        :param nulls_last: place nulls after other values.
+         By default, nulls are less than other values: first in ascending order and last in descending one.
+        :param cached: memoize encoded values, it pays off for columns with few distinct values
+         that are expensive to convert, e.g. dates
+        """
         self._parameter = parameter
+        self._descending = descending
+        self._null_rank = NULL_LAST_RANK if (descending if nulls_last is None else nulls_last) else NULL_RANK
+        self._cached = cached
+        self._cache = functools.lru_cache(maxsize=self.cache_size)(self.to_bytes) if cached else None
+
+    @property
+    def converter(self) -> Callable[[str], bytes]:
+        """``to_bytes`` of column, memoized if column is cached"""
+        return self.to_bytes if self._cache is None else self._cache
+
+    def cache_stats(self) -> CacheStats | None:
+        """Counters of cache since column was created. None if column is not cached"""
+        if self._cache is None:
+            return None
+        info = self._cache.cache_info()
+        # every miss adds a value, values leave cache by eviction only
+        return CacheStats(hits=info.hits, misses=info.misses, evictions=info.misses - info.currsize)
+
+    def __getstate__(self) -> dict:
+        # cache is not pickled, worker process fills its own one
+        return self.__dict__ | {'_cache': None}
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        if self._cached:
+            self._cache = functools.lru_cache(maxsize=self.cache_size)(self.to_bytes)
 
     @classmethod
-    def from_strtype(cls, strtype: str):
-        return cls(parameter=cls._fetch_parameter(strtype)) if cls._has_parameter else cls()
+    def from_strtype(cls, strtype: str, options: Iterable[str] = ()):
+        options = set(options)
+        if {ColumnOption.ASC, ColumnOption.DESC} <= options:
+            raise ValueError(f'Column can not be asc and desc at once: {strtype}')
+        if {ColumnOption.NULLS_FIRST, ColumnOption.NULLS_LAST} <= options:
+            raise ValueError(f'Column can not be nulls_first and nulls_last at once: {strtype}')
+
+        nulls_last = None
+        if ColumnOption.NULLS_FIRST in options:
+            nulls_last = False
+        elif ColumnOption.NULLS_LAST in options:
+            nulls_last = True
+        return cls(
+            parameter=cls._fetch_parameter(strtype) if cls._has_parameter else None,
+            descending=ColumnOption.DESC in options,
+            nulls_last=nulls_last,
+            cached=ColumnOption.CACHED in options,
+        )
 
     @abstractmethod
     def to_python(self, value: str) -> Any:
         pass
 
+    @abstractmethod
+    def _encode(self, value: Any) -> bytes:
+        """Encode python value to bytes that are compared in the same order as values"""
+
+    def to_bytes(self, value: str) -> bytes:
+        """Order preserving binary key of value. Keys of a few columns can be concatenated.
+        Values that can not be converted (nulls) are encoded as a rank byte only.
+        Encodings are prefix free, so inverted bytes give descending order."""
+        try:
+            encoded = self._encode(self.to_python(value))
+        except ValueError:
+            return self._null_rank
+        if self._descending:
+            encoded = encoded.translate(_INVERT)
+        return VALUE_RANK + encoded
+
     @classmethod
     def _fetch_parameter(cls, strtype: str) -> str:
         search = cls._parameter_re.search(strtype)
@@ -32,10 +124,79 @@ class BaseColumn(ABC):
         cls.__columns__[cls._strtype_re] = cls
 
 
+def split_options(strtype: str) -> tuple[str, list[str]]:
+    """Split column type and its options: 'int:desc:nulls_first' -> ('int', ['desc', 'nulls_first'])"""
+    options = []
+    while True:
+        head, sep, tail = strtype.rpartition(':')
+        if not sep or tail not in ColumnOption.values():
+            return strtype, options
+        options.insert(0, tail)
+        strtype = head
+
+
+class ColumnsKey:
+    """Binary key of row by a few columns, so sorting compares plain bytes instead of python objects.
+    Columns are parsed once, key is picklable, so it is shared by files and worker processes."""
+
+    def __init__(self, columns: dict[str, BaseColumn]):
+        self.columns = columns
+        self._converters = [(name, col.converter) for name, col in columns.items()]
+
+    def __call__(self, row: dict) -> bytes:
+        return b''.join([
+            convert(row[name])
+            for name, convert in self._converters
+        ])
+
+    def describe(self, row: dict) -> dict[str, str]:
+        """Values of key columns of row, e.g. min/max keys of shards"""
+        return {name: row[name] for name in self.columns}
+
+    def cache_info(self) -> dict[str, CacheStats]:
+        """Counters of caches of cached columns by name"""
+        return {
+            name: col.cache_stats()
+            for name, col in self.columns.items()
+            if col.cache_stats() is not None
+        }
+
+    def __getstate__(self) -> dict:
+        return {'columns': self.columns}
+
+    def __setstate__(self, state: dict):
+        self.__init__(state['columns'])
+
+
+class AllValuesKey:
+    """Binary key of row by all its values as strings in order of columns (``--by '*'``).
+    Values are joined to one UTF-8 string by a separator that is less than any character,
+    zero characters of values are escaped, so sorting compares plain bytes instead of tuples of strings."""
+
+    _separator = '\x00\x00'
+    _escaped_zero = '\x00\x01'
+
+    def __call__(self, row: dict) -> bytes:
+        return self.encode(row.values())
+
+    def encode(self, values: Collection[str]) -> bytes:
+        """Key of values of the first columns. It is less than keys of all rows that start with them."""
+        text = self._separator.join(values)
+        if text.count('\x00') != len(self._separator) * (len(values) - 1):
+            text = self._separator.join([value.replace('\x00', self._escaped_zero) for value in values])
+        return text.encode('utf-8')
+
+    def describe(self, row: dict) -> dict[str, str]:
+        """Values of row, e.g. min/max keys of shards"""
+        return dict(row)
+
+
 def get_column(strtype: str) -> BaseColumn:
+    """Get column by type with options, e.g. 'int', 'date(%Y-%m-%d):desc', 'float:asc:nulls_last'"""
+    strtype, options = split_options(strtype)
     for strtype_re, col in BaseColumn.__columns__.items():
         if strtype_re.match(strtype):
-            return col.from_strtype(strtype)
+            return col.from_strtype(strtype, options)
     else:
         raise ValueError(f'Not supported column type: {strtype}')
 
@@ -46,6 +207,11 @@ class StrColumn(BaseColumn):
     def to_python(self, value: str) -> str:
         return value
 
+    def _encode(self, value: str) -> bytes:
+        # UTF-8 keeps order of code points, escaped zero bytes and terminator
+        # make encoding prefix free: 'a' < 'a\x00' < 'ab'
+        return value.encode('utf-8').replace(b'\x00', b'\x00\xff') + b'\x00\x00'
+
 
 class IntColumn(BaseColumn):
     _strtype_re = re.compile('int')
@@ -53,6 +219,16 @@ class IntColumn(BaseColumn):
     def to_python(self, value: str) -> int:
         return int(value)
 
+    def _encode(self, value: int) -> bytes:
+        # big-endian magnitude prefixed by its length,
+        # length and magnitude of negative numbers are inverted
+        magnitude = abs(value).to_bytes((abs(value).bit_length() + 7) // 8, 'big')
+        if len(magnitude) > 127:
+            raise ValueError(f'Too big int: {value}')
+        if value < 0:
+            return bytes([0x7f - len(magnitude)]) + bytes(0xff - byte for byte in magnitude)
+        return bytes([0x80 + len(magnitude)]) + magnitude
+
 
 class FloatColumn(BaseColumn):
     _strtype_re = re.compile('float')
@@ -60,6 +236,15 @@ class FloatColumn(BaseColumn):
     def to_python(self, value: str) -> float:
         return float(value)
 
+    def _encode(self, value: float) -> bytes:
+        # IEEE 754 bits with flipped sign bit for positive numbers
+        # and all inverted bits for negative ones. NaN is bigger than inf.
+        if math.isnan(value):
+            value = math.nan
+        (bits,) = struct.unpack('>Q', struct.pack('>d', value + 0.0))  # -0.0 + 0.0 is 0.0
+        bits = bits ^ 0xffff_ffff_ffff_ffff if bits & _SIGN_BIT else bits | _SIGN_BIT
+        return bits.to_bytes(8, 'big')
+
 
 class DateTimeColumn(BaseColumn):
     _has_parameter = True
@@ -68,6 +253,13 @@ class DateTimeColumn(BaseColumn):
     def to_python(self, value: str) -> dt.datetime:
         return dt.datetime.strptime(value, self._parameter)
 
+    def _encode(self, value: dt.datetime) -> bytes:
+        # microseconds since epoch, aware datetime is converted to UTC
+        if value.tzinfo is not None:
+            value = value.astimezone(dt.timezone.utc).replace(tzinfo=None)
+        micros = (value - _EPOCH) // dt.timedelta(microseconds=1)
+        return (micros + _SIGN_BIT).to_bytes(8, 'big')
+
 
 class DateColumn(DateTimeColumn):
     _strtype_re = re.compile('date\(.*\)')
@@ -75,9 +267,16 @@ class DateColumn(DateTimeColumn):
     def to_python(self, value: str) -> dt.date:
         return super().to_python(value).date()
 
+    def _encode(self, value: dt.date) -> bytes:
+        return value.toordinal().to_bytes(4, 'big')
+
 
 class TimeColumn(DateTimeColumn):
     _strtype_re = re.compile('time\(.*\)')
 
     def to_python(self, value: str) -> dt.time:
         return super().to_python(value).time()
+
+    def _encode(self, value: dt.time) -> bytes:
+        micros = ((value.hour * 60 + value.minute) * 60 + value.second) * 1_000_000 + value.microsecond
+        return micros.to_bytes(5, 'big')
@@ -1,11 +1,19 @@
+import csv
+import sys
+import glob
+import json
+import operator
+import tempfile
 from pathlib import Path
-from typing import Iterable, Any
+from typing import Any, Callable, Iterable, Iterator, Optional, Sequence, TextIO
 
 import typer
 
-from .columns import BaseColumn, get_column
-from diskcsvsort import CSVSort, errors
-from diskcsvsort.infany import infany, InfAny
+from .columns import AllValuesKey, BaseColumn, ColumnsKey, get_column
+from diskcsvsort import CSVSort, errors, chunks, read_range
+from diskcsvsort.batch import BatchResult, sort_files
+from diskcsvsort.enums import Stage
+from diskcsvsort.stats import PhaseEvent, SortStats
 
 ALL_COLUMNS = ('*', )
 
@@ -14,84 +22,350 @@ class CLIError(Exception):
     pass
 
 
-def get_all_values(row: dict) -> tuple:
-    return tuple(row.values())
+def expand_sources(sources: Iterable[Path]) -> list[Path]:
+    """Expand glob patterns of source files, e.g. 'data/part-*.csv'
+
+    :raise CLIError: if file does not exist or pattern matches nothing
+    """
+    paths = []
+    for source in sources:
+        if source.exists():
+            paths.append(source)
+            continue
+        matches = sorted(glob.glob(str(source)))
+        if not matches:
+            raise CLIError(f'No such file: {source}')
+        paths.extend(map(Path, matches))
+    return paths
+
+
+def read_paths(path: Path) -> list[Path]:
+    """Read file paths from text file, one per line. Path '-' is stdin."""
+    if str(path) == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        try:
+            lines = path.read_text(encoding='utf-8').splitlines()
+        except OSError as err:
+            raise CLIError(err)
+    return [Path(line.strip()) for line in lines if line.strip()]
 
 
 class CSVSortCLI:
 
     def __init__(
         self,
-        src: Path,
+        src: Path | Sequence[Path],
         encoding: str,
         reverse: bool,
         memory_limit: float,
         by: Iterable[str],
+        disk_limit: float | None = None,
+        progress: bool = False,
+        stats_json: Path | None = None,
+        dest: Path | None = None,
+        workers: int = 1,
+        workdir: Path | None = None,
+        resume: bool = False,
+        index_every: int | None = None,
+        dest_pattern: str | None = None,
+        split_size: float | None = None,
+        split_by: Iterable[str] = (),
+        shards_manifest: Path | None = None,
     ):
         self._by = tuple(by)
         self._memory_limit = memory_limit
+        self._disk_limit = disk_limit
+        self._progress = progress
+        self._stats_json = stats_json
         self._src = src
+        self._dest = dest
+        self._workers = workers
+        self._workdir = workdir or Path(tempfile.gettempdir())
+        self._resume = resume
+        self._index_every = index_every
+        self._dest_pattern = dest_pattern
+        self._split_size = split_size
+        self._shards_manifest = shards_manifest
         self._encoding = encoding
         self._reverse = reverse
         try:
             self._columns = None if self._by == ALL_COLUMNS else self._parse_columns()
         except ValueError as err:
             raise CLIError(err)
+        self._sort_key = AllValuesKey() if self._columns is None else ColumnsKey(self._columns)
+        try:
+            self._split_key = self._get_split_key(tuple(split_by))
+        except (OSError, ValueError) as err:
+            raise CLIError(err)
+
+    def run(self) -> SortStats:
+        csvsort = self._get_csvsort()
+        try:
+            stats = csvsort.apply()
+        except errors.CSVSortError as err:
+            raise CLIError(err)
+
+        if self._stats_json is not None:
+            self._stats_json.write_text(json.dumps(stats.to_dict(), indent=2))
+        return stats
+
+    def check(self) -> bool:
+        """Check if CSV files are sorted without sorting them"""
+        csvsort = self._get_csvsort()
+        try:
+            return csvsort.is_sorted()
+        except errors.CSVSortError as err:
+            raise CLIError(err)
 
-    def run(self):
-        key = get_all_values if self._by == ALL_COLUMNS else self._key
-        csvsort = CSVSort(
-            src=self._src,
-            key=key,
+    def run_batch(self) -> Iterator[BatchResult]:
+        """Sort every source file in place. Files are distributed between workers."""
+        if self._workers < 1:
+            raise CLIError(f'workers must be positive: {self._workers}')
+        return sort_files(
+            self._src,
+            key=self._sort_key,
+            workers=self._workers,
+            workdir=self._workdir,
             memory_limit=self._memory_limit,
+            disk_limit=self._disk_limit,
             reverse=self._reverse,
             encoding=self._encoding,
+            index_every=self._index_every,
         )
 
+    def write_range(self, file: TextIO, start: Sequence[str] = (), stop: Sequence[str] = ()) -> int:
+        """Write rows of sorted CSV file in range ``start <= key < stop`` to file.
+        Range is set by values of the first columns in order of sorting.
+
+        :return: count of rows
+        """
         try:
-            csvsort.apply()
-        except errors.CSVSortError as err:
+            header, _ = chunks.read_header(self._src, self._encoding)
+            rows = read_range(
+                self._src,
+                key=self._sort_key,
+                start=self._range_key(start),
+                stop=self._range_key(stop),
+                encoding=self._encoding,
+            )
+            writer = csv.DictWriter(file, fieldnames=header)
+            writer.writeheader()
+            count = 0
+            for count, row in enumerate(rows, start=1):
+                writer.writerow(row)
+        except (OSError, ValueError) as err:
+            raise CLIError(err)
+        return count
+
+    def _range_key(self, values: Sequence[str]) -> Any:
+        """Key of range bound by values of the first columns.
+        Encodings of values are prefix free, so it is less than keys of all rows that start with these values.
+
+        :raise ValueError: if there are more values than columns or value has wrong type
+        """
+        if not values:
+            return None
+        if self._columns is None:
+            return self._sort_key.encode(values)
+        if len(values) > len(self._columns):
+            raise ValueError(f'Range has more values than columns: {", ".join(values)}')
+        for (name, col), value in zip(self._columns.items(), values):
+            try:
+                col.to_python(value)
+            except ValueError:
+                raise ValueError(f'Range value {value!r} does not match type of column {name}')
+        return b''.join(col.to_bytes(value) for col, value in zip(self._columns.values(), values))
+
+    def _get_split_key(self, names: Sequence[str]) -> Callable[[dict], Any] | None:
+        """Key of shards by the first columns of sorting, so shards have non-overlapping key ranges
+
+        :raise ValueError: if columns are not the first columns of sorting
+        :raise OSError: if header of source file can not be read
+        """
+        if not names:
+            return None
+        if self._columns is None:
+            # rows are sorted by all columns in order of header
+            src = self._src if isinstance(self._src, Path) else self._src[0]
+            columns, _ = chunks.read_header(src, self._encoding)
+        else:
+            columns = list(self._columns)
+        if list(names) != columns[:len(names)]:
+            raise ValueError(f'Split columns have to be the first columns of sorting: {", ".join(names)}')
+        if self._columns is None:
+            return operator.itemgetter(*names)
+        return ColumnsKey({name: self._columns[name] for name in names})
+
+    def _get_csvsort(self) -> CSVSort:
+        try:
+            return CSVSort(
+                src=self._src,
+                dest=self._dest,
+                workers=self._workers,
+                workdir=self._workdir,
+                resume=self._resume,
+                index_every=self._index_every,
+                dest_pattern=self._dest_pattern,
+                split_size=self._split_size,
+                split_key=self._split_key,
+                shards_manifest=self._shards_manifest,
+                key=self._sort_key,
+                memory_limit=self._memory_limit,
+                disk_limit=self._disk_limit,
+                reverse=self._reverse,
+                encoding=self._encoding,
+                on_event=self._print_event if self._progress else None,
+            )
+        except ValueError as err:
             raise CLIError(err)
 
+    @staticmethod
+    def _print_event(event: PhaseEvent):
+        if event.stage == Stage.END:
+            typer.echo(str(event), err=True)
+
     def _parse_columns(self) -> dict[str, BaseColumn]:
         columns = {}
         for item in self._by:
-            name, strtype = item.split(':')
+            name, _, strtype = item.partition(':')
+            if not strtype:
+                raise ValueError(f'Column type is not set: {item}')
             columns[name] = get_column(strtype)
         return columns
 
-    @staticmethod
-    def _to_python_or_default(value: str, col: BaseColumn) -> Any | InfAny:
-        try:
-            return col.to_python(value)
-        except ValueError:
-            return -infany
-
-    def _key(self, row: dict) -> tuple:
-        return tuple(
-            self._to_python_or_default(row[name], col)
-            for name, col in self._columns.items()
-        )
-
 
 def cli_run(
-    src: Path = typer.Argument(..., exists=True, help='CSV file path.'),
+    src: list[Path] = typer.Argument(..., help='CSV file paths or glob patterns, e.g. "data/part-*.csv".'),
+    dest: Optional[Path] = typer.Option(None, help='Sorted CSV file path. Required for a few files. '
+                                                   'Source file is sorted in place by default.'),
+    workers: int = typer.Option(1, help='Processes that parse, check and sort files in parallel.'),
     encoding: str = typer.Option('utf-8', help='File encoding.'),
     reverse: bool = typer.Option(False, help='use DSC.'),
     memory_limit: float = typer.Option(300 * 1024 * 1024, help='Memory limit. Default is 300 MB.'),
-    by: list[str] = typer.Option(ALL_COLUMNS, help='Columns for sorting. Coma separated.'),
+    by: list[str] = typer.Option(
+        ALL_COLUMNS,
+        help='Columns for sorting: name:type[:asc|desc][:nulls_first|nulls_last][:cached]. Use option for every column.',
+    ),
+    disk_limit: Optional[float] = typer.Option(None, help='Limit of temporary files size in bytes. '
+                                                          'Unlimited by default.'),
+    progress: bool = typer.Option(False, help='Print sorting phases to stderr.'),
+    stats_json: Optional[Path] = typer.Option(None, help='Save sorting stats to JSON file.'),
+    check: bool = typer.Option(False, help='Only check if CSV files are sorted. Exit code is 1 if they are not.'),
+    workdir: Optional[Path] = typer.Option(None, help='Directory of temporary files. '
+                                                      'OS temporary directory by default.'),
+    resume: bool = typer.Option(False, help='Keep progress in workdir and continue interrupted sorting from it.'),
+    index_every: Optional[int] = typer.Option(None, help='Save index of every Nth row key for "range" command.'),
+    dest_pattern: Optional[str] = typer.Option(None, help='Write sorted rows to shards instead of one file, '
+                                                          'path pattern has shard number, e.g. "sorted-{n:04d}.csv".'),
+    split_by_size: Optional[float] = typer.Option(None, help='Max size of shard in bytes.'),
+    split_by_key: list[str] = typer.Option([], help='Start a new shard when value of column changes. '
+                                                    'Columns have to be the first columns of --by.'),
+    shards_manifest: Optional[Path] = typer.Option(None, help='Save JSON manifest of shards with their min/max keys.'),
 ):
 
     try:
+        sources = expand_sources(src)
         cli = CSVSortCLI(
-            src=src,
+            src=sources,
+            dest=dest,
+            workers=workers,
             encoding=encoding,
             reverse=reverse,
             memory_limit=memory_limit,
             by=by,
+            disk_limit=disk_limit,
+            progress=progress,
+            stats_json=stats_json,
+            workdir=workdir,
+            resume=resume,
+            index_every=index_every,
+            dest_pattern=dest_pattern,
+            split_size=split_by_size,
+            split_by=split_by_key,
+            shards_manifest=shards_manifest,
         )
-        cli.run()
+        if check:
+            is_sorted = cli.check()
+        else:
+            cli.run()
     except CLIError as err:
         print(f'Error: {err}')
     else:
-        print(f'CSV file has been sorted: {src}')
+        if not check:
+            print(f'CSV file has been sorted: {dest or dest_pattern or sources[0]}')
+        elif is_sorted:
+            print(f'CSV file is sorted: {", ".join(map(str, sources))}')
+        else:
+            print(f'CSV file is not sorted: {", ".join(map(str, sources))}')
+            raise typer.Exit(code=1)
+
+
+def cli_range(
+    src: Path = typer.Argument(..., help='Sorted CSV file path.'),
+    by: list[str] = typer.Option(ALL_COLUMNS, help='Columns of sorting, the same as the file was sorted by.'),
+    start: list[str] = typer.Option([], help='The first value of range. Use option for every first column.'),
+    stop: list[str] = typer.Option([], help='Value after range. Use option for every first column.'),
+    encoding: str = typer.Option('utf-8', help='File encoding.'),
+    output: Optional[Path] = typer.Option(None, help='CSV file path for rows of range. Stdout by default.'),
+):
+    """Print rows of sorted CSV file in range: start <= row < stop. Index of the file is used if it was saved."""
+    try:
+        cli = CSVSortCLI(src=src, encoding=encoding, reverse=False, memory_limit=0, by=by)
+        if output is None:
+            cli.write_range(sys.stdout, start=start, stop=stop)
+        else:
+            with output.open('w', encoding=encoding, newline='') as file:
+                cli.write_range(file, start=start, stop=stop)
+    except CLIError as err:
+        print(f'Error: {err}')
+        raise typer.Exit(code=1)
+
+
+def cli_batch(
+    src: Optional[list[Path]] = typer.Argument(None, help='CSV file paths or glob patterns.'),
+    from_list: Optional[Path] = typer.Option(None, help='Text file with CSV file paths, one per line. "-" is stdin.'),
+    workers: int = typer.Option(1, help='Processes that sort files in parallel.'),
+    encoding: str = typer.Option('utf-8', help='File encoding.'),
+    reverse: bool = typer.Option(False, help='use DSC.'),
+    memory_limit: float = typer.Option(300 * 1024 * 1024, help='Memory limit of every worker. Default is 300 MB.'),
+    by: list[str] = typer.Option(
+        ALL_COLUMNS,
+        help='Columns for sorting: name:type[:asc|desc][:nulls_first|nulls_last][:cached]. Use option for every column.',
+    ),
+    disk_limit: Optional[float] = typer.Option(None, help='Limit of temporary files size of every worker in bytes. '
+                                                          'Unlimited by default.'),
+    workdir: Optional[Path] = typer.Option(None, help='Directory of temporary files. '
+                                                      'OS temporary directory by default.'),
+    index_every: Optional[int] = typer.Option(None, help='Save index of every Nth row key for "range" command.'),
+):
+    """Sort many CSV files in place by one process: options are parsed once, small files are read once."""
+    try:
+        sources = expand_sources(src or [])
+        if from_list is not None:
+            sources.extend(read_paths(from_list))
+        if not sources:
+            raise CLIError('There are no CSV files')
+        cli = CSVSortCLI(
+            src=sources,
+            workers=workers,
+            encoding=encoding,
+            reverse=reverse,
+            memory_limit=memory_limit,
+            by=by,
+            disk_limit=disk_limit,
+            workdir=workdir,
+            index_every=index_every,
+        )
+        failed = 0
+        for result in cli.run_batch():
+            if result.error is not None:
+                failed += 1
+                print(f'Error: {result.path}: {result.error}')
+    except CLIError as err:
+        print(f'Error: {err}')
+        raise typer.Exit(code=1)
+
+    print(f'CSV files have been sorted: {len(sources) - failed} of {len(sources)}')
+    if failed:
+        raise typer.Exit(code=1)
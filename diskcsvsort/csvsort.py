@@ -1,77 +1,307 @@
+import io
+import os
 import sys
 import csv
+import gzip
+import time
+import zlib
+import heapq
+import shutil
+import logging
 import operator
 import tempfile
+import dataclasses
 from pathlib import Path
-from typing import Callable, TypeAlias, Any, NoReturn, Iterable, Sequence
+from itertools import chain
+from contextlib import contextmanager, ExitStack
+from typing import Callable, TypeAlias, Any, NoReturn, Iterable, Sequence, TextIO, Iterator, TYPE_CHECKING
 
-from diskcsvsort import errors
+from diskcsvsort import errors, chunks, checkpoint
+from diskcsvsort.chunks import Segment
+from diskcsvsort.disk import DiskUsage
+from diskcsvsort.enums import Phase, Stage
+from diskcsvsort.index import KeyIndex
+from diskcsvsort.shards import Shard, ShardWriter, check_pattern
+from diskcsvsort.stats import CacheStats, PhaseEvent, SortStats
 from diskcsvsort.temp import get_path_tempfile
 
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
 _ROW: TypeAlias = dict[str, str]
 
+logger = logging.getLogger(__name__)
+
 
 class CSVSort:
-    """CSV sorting using disk to reduce RAM usage"""
+    """CSV sorting using disk to reduce RAM usage.
+
+    Sorting is stable: rows with equal keys keep their order from the source file.
+    """
 
-    _operators = [
-        operator.lt,
-        operator.eq,
-        operator.gt,
-    ]
+    # channels of partitioning: rows < base, rows = base, rows > base
+    _channels_count = 3
+
+    # how often (in rows) disk usage of runs is checked during partitioning
+    _disk_check_rows = 10_000
+    # bytes of CSV file that are compressed to estimate the compression ratio of runs
+    _compression_sample_size = 1024 * 1024
+    # max count of runs that are merged at once, more runs are merged by a few levels
+    _merge_fan_in = 128
+    # min size of file segment that is parsed by a worker
+    _min_segment_size = 16 * 1024 * 1024
+    # max size of file segment that is split to runs between checkpoints of resumable sorting
+    _checkpoint_size = 64 * 1024 * 1024
 
     def __init__(
         self,
-        src: Path,
+        src: Path | Sequence[Path],
         *,
         key: Callable[[_ROW], Any],
+        dest: Path | None = None,
+        workers: int = 1,
         workdir: Path = Path(tempfile.gettempdir()),
         memory_limit: float = 300 * 1024 * 1024,  # 300 mb
         reverse: bool = False,
         encoding: str = 'utf-8',
+        disk_limit: float | None = None,
+        on_event: Callable[[PhaseEvent], Any] | None = None,
+        resume: bool = False,
+        index_every: int | None = None,
+        dest_pattern: str | None = None,
+        split_size: float | None = None,
+        split_key: Callable[[_ROW], Any] | None = None,
+        shards_manifest: Path | None = None,
     ):
         """
-        :param src: CSV file path
-        :param key: sorting key function
+        :param src: CSV file path or paths of CSV files with the same header
+        :param key: sorting key function. If key has ``cache_info()`` method that returns ``CacheStats``
+         of its caches by name, they are added to stats. If key has ``describe(row)`` method,
+         it returns JSON serializable min/max keys of shards for ``shards_manifest``.
+        :param dest: path of sorted CSV file. Required for a few source files.
+         If it is not set, the source file is sorted in place.
+        :param workers: count of processes that parse, check and sort source files in parallel.
+         Big files are split to segments for workers. Key must be picklable if there are a few workers.
         :param workdir: directory where will be created temporary files for sorting
         :param memory_limit: RAM limits for sorting
         :param reverse: ASC if reverse is False else DSC
         :param encoding: encoding of CSV file
+        :param disk_limit: max bytes that temporary files may take in workdir at once.
+         Runs are compressed if plain ones do not fit. Unlimited if None.
+        :param on_event: callback that is called on start and end of every sorting phase.
+         Events are logged to ``diskcsvsort.csvsort`` logger with DEBUG level as well.
+        :param resume: keep a manifest of finished runs and merges in workdir, so sorting that was
+         interrupted (e.g. the process was killed) continues from them on the next call with the same
+         src, dest and key. Sorting is done by external merge sort then.
+        :param index_every: save sparse key index of the sorted file near it (``<dest>.idx``):
+         keys of every Nth row and their offsets, so key ranges are read by ``read_range`` without reading
+         the whole file. Index is built while the sorted file is written, or by reading it if it was sorted already.
+        :param dest_pattern: write sorted rows to shards instead of dest, pattern of their paths has shard number,
+         e.g. ``'sorted-{n:04d}.csv'``. Every shard has the header. Source files are not changed.
+        :param split_size: max bytes of shard, shard with one row may be bigger
+        :param split_key: function of row, a new shard is started when its value changes.
+         If it is a prefix of the sorting key, shards have non-overlapping key ranges.
+        :param shards_manifest: path of JSON manifest of shards: their paths, rows, bytes and min/max keys
 
         NOTE: Be careful when choosing the memory_limit.
         The smaller this limit, the longer it takes to sort.
         """
+        self._sources = [src] if isinstance(src, (str, os.PathLike)) else list(src)
+        if not self._sources:
+            raise ValueError('There are no source CSV files')
+        if dest is not None and dest_pattern is not None:
+            raise ValueError('dest and dest_pattern can not be set together')
+        if dest is None and dest_pattern is None and len(self._sources) > 1:
+            raise ValueError('dest is required for a few source CSV files')
+        if dest_pattern is None and (split_size, split_key, shards_manifest) != (None, None, None):
+            raise ValueError('split_size, split_key and shards_manifest require dest_pattern')
+        if dest_pattern is not None:
+            check_pattern(dest_pattern)
+        if split_size is not None and split_size <= 0:
+            raise ValueError(f'split_size must be positive: {split_size}')
+        if workers < 1:
+            raise ValueError(f'workers must be positive: {workers}')
+        if index_every is not None and index_every < 1:
+            raise ValueError(f'index_every must be positive: {index_every}')
+
         self._encoding = encoding
-        self._src = src
+        self._src = self._sources[0]
+        self._dest = dest
+        self._workers = workers
         self._key = key
         self._workdir = workdir
         self._memory_limit = memory_limit
         self._reverse = reverse
+        self._disk = DiskUsage(workdir, limit=disk_limit)
+        self._compress = False
+        self._compression_ratio = 1.0
+        self._on_event = on_event
+        self._resume = resume
+        self._manifest: checkpoint.Manifest | None = None
+        self._run_prefix: str | None = None
+        self._index_every = index_every
+        self._index: KeyIndex | None = None
+        self._dest_pattern = dest_pattern
+        self._split_size = split_size
+        self._split_key = split_key
+        self._shards_manifest = shards_manifest
+        self._shards: list[Shard] = []
+        self._depth = 0
+        self._events: list[PhaseEvent] = []
+        self._stats = SortStats()
 
         self._workdir.mkdir(parents=True, exist_ok=True)
 
-    def apply(self) -> NoReturn:
-        """Do sorting"""
+    def apply(self) -> SortStats:
+        """Do sorting
+
+        :return: summary stats of sorting
+        """
+        self._stats = SortStats()
+        wall_time, cpu_time = time.perf_counter(), time.process_time()
+        key_cache = self._key_cache()
+        self._shards = []
+        # shards are indexed by the shard writer
+        self._index = None
+        if self._index_every is not None and self._dest_pattern is None:
+            self._index = KeyIndex(every=self._index_every, reverse=self._reverse)
         try:
-            return self._hybrid_sort(self._src)
+            if self._dest is None and self._dest_pattern is None and self._workers == 1 and not self._resume:
+                dest = self._hybrid_sort(self._src)
+            elif self._dest_pattern is not None:
+                dest = self._external_sort(self._sources, Path(self._dest_pattern))
+            else:
+                dest = self._external_sort(self._sources, self._dest or self._src)
         except RecursionError as err:
             raise errors.CSVSortError(err)
 
+        if self._index is not None:
+            if not self._index.rows:
+                # sorted file was not written, e.g. it is sorted already
+                self._index.build(dest, key=self._key, encoding=self._encoding)
+            self._index.save(dest)
+
+        if self._dest_pattern is None:
+            self._stats.bytes = dest.stat().st_size
+        else:
+            self._stats.bytes = sum(shard.bytes for shard in self._shards)
+            self._stats.shards = len(self._shards)
+        self._stats.temp_bytes_written = self._disk.written
+        self._stats.temp_bytes_peak = self._disk.peak
+        self._stats.wall_time = time.perf_counter() - wall_time
+        self._stats.cpu_time = time.process_time() - cpu_time
+        self._stats.add_key_cache({
+            name: cache_stats - key_cache.get(name, CacheStats())
+            for name, cache_stats in self._key_cache().items()
+        })
+        return self._stats
+
+    def _key_cache(self) -> dict[str, CacheStats]:
+        """Counters of caches of key in this process"""
+        cache_info = getattr(self._key, 'cache_info', None)
+        return {} if cache_info is None else cache_info()
+
+    @property
+    def shards(self) -> list[Shard]:
+        """Shards that were written by the last sorting to dest_pattern"""
+        return self._shards
+
+    @property
+    def disk_usage(self) -> DiskUsage:
+        """Accounting of temporary files written during sorting"""
+        return self._disk
+
+    @contextmanager
+    def _phase(self, phase: Phase, path: Path) -> Iterator[PhaseEvent]:
+        """Measure phase of sorting and emit its start and end events.
+        Counters of the phase are collected by ``_count``."""
+        event = PhaseEvent(phase=phase, path=path, depth=self._depth, temp_bytes=self._disk.current)
+        self._emit(dataclasses.replace(event))
+        wall_time, cpu_time = time.perf_counter(), time.process_time()
+        self._events.append(event)
+        try:
+            yield event
+        finally:
+            self._events.pop()
+
+        event.stage = Stage.END
+        event.wall_time = time.perf_counter() - wall_time
+        event.cpu_time = time.process_time() - cpu_time
+        event.temp_bytes = self._disk.current
+        self._record(event)
+
+    def _record(self, event: PhaseEvent) -> NoReturn:
+        """Add the end event of phase to stats and emit it"""
+        self._stats.add(event)
+        if event.depth == 0:
+            self._stats.rows = max(self._stats.rows, event.rows)
+        self._emit(event)
+
+    def _count(self, rows: int = 0, bytes_read: int = 0, bytes_written: int = 0, runs: int = 0) -> NoReturn:
+        """Add counters to the current phase"""
+        if self._events:
+            event = self._events[-1]
+            event.rows += rows
+            event.bytes_read += bytes_read
+            event.bytes_written += bytes_written
+            event.runs += runs
+
+    def _emit(self, event: PhaseEvent) -> NoReturn:
+        logger.debug('%s', event)
+        if self._on_event is not None:
+            self._on_event(event)
+
+    def _open(self, path: Path, mode: str = 'r') -> TextIO:
+        """Open CSV file for reading or writing. Compressed runs (*.gz) are handled transparently"""
+        if path.suffix == '.gz':
+            return gzip.open(path, f'{mode}t', compresslevel=1, encoding=self._encoding, newline='')
+        return path.open(mode, encoding=self._encoding, newline='')
+
+    @contextmanager
+    def _replace(self, dest: Path) -> Iterator[Path]:
+        """Path to write dest. Separate dest and source files of resumable sorting are written
+        to a temporary file near them that atomically replaces them at the end,
+        so they are never left partly written. Otherwise, source file is rewritten in place:
+        it takes no space for a copy and links to it stay links."""
+        if self._disk.tracks(dest) or (not self._resume and self._is_source(dest)):
+            yield dest
+            return
+
+        prefix = f'.{dest.name}.{self._run_prefix or ""}'
+        with get_path_tempfile(directory=dest.parent, prefix=prefix, suffix='.tmp') as path:
+            yield path
+            if dest.exists():
+                shutil.copymode(dest, path)
+            if self._resume:
+                checkpoint.fsync(path)
+            os.replace(path, dest)
+
+    def _is_source(self, path: Path) -> bool:
+        return any(
+            path == src or (path.exists() and src.exists() and path.samefile(src))
+            for src in self._sources
+        )
+
     def _csv_is_sorted(self, src: Path) -> bool:
         """Check if CSV is already sorted"""
         operator_ = operator.ge if self._reverse else operator.le
-        with src.open('r', encoding=self._encoding) as file:
+        self._count(bytes_read=src.stat().st_size)
+        with self._open(src) as file:
             reader = csv.DictReader(file)
             try:
                 base_key = self._key(next(reader))
             except StopIteration:
                 return False
 
-            for row in reader:
-                row_key = self._key(row)
-                if not operator_(base_key, row_key):
-                    return False
-                base_key = row_key
+            rows = 1
+            try:
+                for rows, row in enumerate(reader, start=2):
+                    row_key = self._key(row)
+                    if not operator_(base_key, row_key):
+                        return False
+                    base_key = row_key
+            finally:
+                self._count(rows=rows)
         return True
 
     def _reached_memory_limit(self, src: Path) -> bool:
@@ -80,7 +310,7 @@ class CSVSort:
         :raise CSVSortError: if one row take more memory than memory limit
         """
         memory_usage = 0
-        with src.open('r', encoding=self._encoding) as file:
+        with self._open(src) as file:
             for i, row in enumerate(csv.DictReader(file)):
                 row_memory_usage = sys.getsizeof(row)
                 if row_memory_usage > self._memory_limit:
@@ -93,15 +323,57 @@ class CSVSort:
 
     def _hybrid_sort(self, src: Path) -> Path:
         """Sort CSV in memory if file is less than memory_limit.
-        Else sort CSV in disk"""
-        if self._csv_is_sorted(src):
-            return src
+        Else sort CSV in disk.
+        File that is not bigger than memory_limit is read once: its rows are checked and sorted in memory."""
+        with self._phase(Phase.PROBE, src):
+            small = src.stat().st_size <= self._memory_limit
+            rows = self._read_rows(src) if small else None
+            if rows is not None:
+                header, rows, keys = rows
+                if self._keys_are_sorted(keys):
+                    return src
+            elif self._csv_is_sorted(src):
+                return src
+            else:
+                reached_memory_limit = small or self._reached_memory_limit(src)
 
-        if self._reached_memory_limit(src):
+        if rows is not None:
+            return self._memory_sort(src, loaded=(header, rows, keys))
+        elif reached_memory_limit:
             return self._disk_sort(src)
         else:
             return self._memory_sort(src)
 
+    def _read_rows(self, src: Path) -> tuple[list[str], list[_ROW], list] | None:
+        """Read header, rows of CSV file and their keys if rows fit to memory_limit
+
+        :return: None if rows do not fit to memory_limit
+        :raise CSVFileEmptyError: if CSV file is empty
+        :raise CSVSortError: if one row take more memory than memory limit
+        """
+        rows: list[_ROW] = []
+        memory_usage = 0
+        with self._open(src) as file:
+            reader = csv.DictReader(file)
+            if reader.fieldnames is None:
+                raise errors.CSVFileEmptyError(src)
+            for i, row in enumerate(reader):
+                row_memory_usage = sys.getsizeof(row)
+                if row_memory_usage > self._memory_limit:
+                    raise errors.CSVSortError(f'Row #{i} use memory {row_memory_usage}'
+                                              f'more than memory_limit: {self._memory_limit}')
+                memory_usage += row_memory_usage
+                if memory_usage > self._memory_limit:
+                    return None
+                rows.append(row)
+
+        self._count(rows=len(rows), bytes_read=src.stat().st_size)
+        return reader.fieldnames, rows, [self._key(row) for row in rows]
+
+    def _keys_are_sorted(self, keys: Sequence) -> bool:
+        operator_ = operator.ge if self._reverse else operator.le
+        return all(map(operator_, keys, keys[1:]))
+
     def _disk_sort(self, src: Path) -> Path:
         """Sort csv file disk using quick sort approach.
         :raise CSVFileEmptyError: if CSV file is empty
@@ -109,70 +381,165 @@ class CSVSort:
         files_to_sort: list[Path] = []
         files_to_close = []
 
-        with src.open('r', encoding=self._encoding) as src_file:
+        with self._phase(Phase.PARTITION, src), self._open(src) as src_file:
             reader = csv.DictReader(src_file)
             if reader.fieldnames is None:
                 raise errors.CSVFileEmptyError(src)
 
+            # every channel has the header, the source file has one only
+            header = io.StringIO()
+            csv.writer(header).writerow(reader.fieldnames)
+            header_size = len(header.getvalue().encode(self._encoding))
+            self._reserve_runs(src, size=src.stat().st_size + (self._channels_count - 1) * header_size)
+
             # filter rows to 3 channels:
             #   - rows < base
             #   - rows = base
             #   - rows > base
             channels = []
-            for operator_ in self._operators:
+            for _ in range(self._channels_count):
                 with get_path_tempfile(
-                    suffix='.csv',
+                    suffix='.csv.gz' if self._compress else '.csv',
                     directory=self._workdir,
                     delete=False,
                 ) as path_tempfile:
-                    temp_file = path_tempfile.open(
-                        mode='w',
-                        encoding=self._encoding,
-                        newline='',
-                    )
                     files_to_sort.append(path_tempfile)
+                    self._disk.track(path_tempfile)
+                    temp_file = self._open(path_tempfile, 'w')
                     files_to_close.append(temp_file)
                     writer = csv.DictWriter(temp_file, fieldnames=reader.fieldnames)
                     writer.writeheader()
-                    channels.append((writer, operator_))
+                    channels.append(writer)
 
             try:
-                base_row = next(reader)
-            except StopIteration:
-                raise errors.CSVFileEmptyError(src)
+                try:
+                    rows = self._partition(src, reader, channels, files_to_sort)
+                finally:
+                    for file in files_to_close:
+                        file.close()
+                for path in files_to_sort:
+                    self._disk.update(path)
+            except BaseException:
+                self._delete_runs(files_to_sort)
+                raise
+            self._count(
+                rows=rows,
+                bytes_read=src.stat().st_size,
+                bytes_written=sum(path.stat().st_size for path in files_to_sort),
+                runs=len(files_to_sort),
+            )
 
-            base_key = self._key(base_row)
-
-            for writer, operator_ in channels:
-                if operator_(base_key, base_key):
-                    writer.writerow(base_row)
-                    break
-
-            for row in reader:
-                for writer, operator_ in channels:
-                    if operator_(self._key(row), base_key):
-                        writer.writerow(row)
-                        break
+        try:
+            if self._disk.tracks(src):
+                # src is a run of the upper level, all its rows are in channels now
+                # and it will be rewritten by merge, so reclaim its space right away
+                src.write_bytes(b'')
+                self._disk.update(src)
 
-            for file in files_to_close:
-                file.close()
+            # rows of the middle channel are equal, so they are already sorted
+            # and keep the order of the source file
+            less, equal, greater = files_to_sort
+            self._depth += 1
+            try:
+                files_to_merge = [self._hybrid_sort(less), equal, self._hybrid_sort(greater)]
+            finally:
+                self._depth -= 1
 
             if self._reverse:
-                files_to_sort.reverse()
+                files_to_merge.reverse()
 
-            files_to_merge = map(self._hybrid_sort, files_to_sort)
-            self._merge_csvs(src, *files_to_merge, delete=True)
+            with self._phase(Phase.MERGE, src):
+                bytes_read = sum(path.stat().st_size for path in files_to_merge)
+                with self._replace(src) as dest:
+                    index = None if self._disk.tracks(src) else self._index
+                    self._merge_csvs(dest, *files_to_merge, delete=True, index=index)
+                self._count(rows=rows, bytes_read=bytes_read, bytes_written=src.stat().st_size)
+        except BaseException:
+            # runs of this level that are not merged yet, runs of deeper levels are deleted by them
+            self._delete_runs(files_to_sort)
+            raise
         return src
 
-    def _merge_csvs(self, dest: Path, *csvfiles: Path, delete: bool = False) -> NoReturn:
+    def _partition(self, src: Path, reader: csv.DictReader, channels: list, paths: list[Path]) -> int:
+        """Filter rows to channels comparing them with the first row.
+        Rows are written in order of reading, so every channel keeps the order of equal rows.
+        Rows that are neither less nor greater than the base row are equal to it.
+
+        :return: count of rows
+
+        :raise CSVFileEmptyError: if there are no rows
+        :raise DiskLimitError: if channels do not fit to the disk limit
+        """
+        try:
+            base_row = next(reader)
+        except StopIteration:
+            raise errors.CSVFileEmptyError(src)
+
+        base_key = self._key(base_row)
+        less, equal, greater = channels
+        equal.writerow(base_row)
+
+        rows = 1
+        for rows, row in enumerate(reader, start=2):
+            row_key = self._key(row)
+            if row_key < base_key:
+                less.writerow(row)
+            elif row_key > base_key:
+                greater.writerow(row)
+            else:
+                equal.writerow(row)
+            if rows % self._disk_check_rows == 0:
+                for path in paths:
+                    self._disk.update(path)
+        return rows
+
+    def _reserve_runs(self, src: Path, size: int | None = None) -> NoReturn:
+        """Make sure that runs of ``src`` fit to the disk before partitioning it.
+        Switch to compressed runs if plain runs do not fit.
+
+        :param size: size of the part of ``src`` that is split to runs. The whole file by default.
+        :raise DiskLimitError: if runs do not fit even compressed
+        """
+        size = src.stat().st_size if size is None else size
+        if src.suffix != '.gz':
+            if not self._compress and size > self._disk.available:
+                self._compress = True
+                self._compression_ratio = self._estimate_compression_ratio(src)
+            if self._compress:
+                size *= self._compression_ratio
+        self._disk.reserve(size, what=f'Partitioning of {src}')
+
+    def _estimate_compression_ratio(self, src: Path) -> float:
+        """Compress the beginning of CSV file to estimate how well runs are compressed"""
+        with src.open('rb') as file:
+            sample = file.read(self._compression_sample_size)
+        if not sample:
+            return 1.0
+        # leave some headroom, the rest of file may be compressed worse
+        return min(1.0, 1.2 * len(zlib.compress(sample, 1)) / len(sample))
+
+    def _merge_csvs(
+        self,
+        dest: Path,
+        *csvfiles: Path,
+        delete: bool = False,
+        index: KeyIndex | None = None,
+    ) -> NoReturn:
         """Merge few CSV files to the one.
+        If dest is a temporary file, space for every file is reserved before it is copied,
+        files that are deleted after copying free space for the next ones.
+
+        :param index: index of dest that is filled while rows are written
         :raise CSVFileEmptyError is CSV file is empty
+        :raise DiskLimitError: if copy of file does not fit to the disk limit
         """
         need_header = True
-        with dest.open('w', encoding=self._encoding, newline='') as dst_file:
+        with self._open(dest, 'w') as dst_file:
             writer = csv.writer(dst_file)
             for csvfile in csvfiles:
-                with csvfile.open('r', encoding=self._encoding) as file:
+                if self._disk.tracks(dest):
+                    self._disk.reserve(csvfile.stat().st_size, what=f'Merging of {csvfile} to {dest}')
+                with self._open(csvfile) as file:
                     reader = csv.reader(file)
                     try:
                         header = next(reader)
@@ -181,24 +548,589 @@ class CSVSort:
                     if need_header:
                         writer.writerow(header)
                         need_header = False
-                    writer.writerows(reader)
+                    if index is None:
+                        writer.writerows(reader)
+                    else:
+                        index.writerows(dst_file, writer, reader, key=lambda row: self._key(dict(zip(header, row))))
 
                 if delete:
                     csvfile.unlink(missing_ok=True)
+                    self._disk.forget(csvfile)
+        self._disk.update(dest)
 
-    def _memory_sort(self, src: Path) -> Path:
-        """Just sort CSV file in memory"""
-        with src.open('r', encoding=self._encoding) as file:
-            reader = csv.DictReader(file)
-            if reader.fieldnames is None:
-                raise errors.CSVFileEmptyError(src)
-            sorted_rows = sorted(reader, key=self._key, reverse=self._reverse)
-        self._save_csv(sorted_rows, filepath=src, header=reader.fieldnames)
+    def _memory_sort(self, src: Path, loaded: tuple[list[str], list[_ROW], list] | None = None) -> Path:
+        """Just sort CSV file in memory
+
+        :param loaded: header, rows and their keys if they are read already
+        """
+        with self._phase(Phase.SORT, src):
+            if loaded is None:
+                with self._open(src) as file:
+                    reader = csv.DictReader(file)
+                    if reader.fieldnames is None:
+                        raise errors.CSVFileEmptyError(src)
+                    header = reader.fieldnames
+                    sorted_rows = sorted(reader, key=self._key, reverse=self._reverse)
+                self._count(bytes_read=src.stat().st_size)
+            else:
+                header, rows, keys = loaded
+                # sorting of positions is stable and does not compute keys again
+                order = sorted(range(len(rows)), key=keys.__getitem__, reverse=self._reverse)
+                sorted_rows = [rows[i] for i in order]
+            self._count(rows=len(sorted_rows))
+
+        with self._phase(Phase.WRITE, src):
+            with self._replace(src) as dest:
+                index = None if self._disk.tracks(src) else self._index
+                self._save_csv(sorted_rows, filepath=dest, header=header, index=index)
+            self._disk.update(src)
+            self._count(rows=len(sorted_rows), bytes_written=src.stat().st_size)
         return src
 
-    def _save_csv(self, rows: Iterable[_ROW], filepath: Path, header: Sequence[str]) -> NoReturn:
-        """Save rows to CSV file"""
-        with filepath.open('w', encoding=self._encoding, newline='') as file:
+    def _external_sort(self, sources: Sequence[Path], dest: Path) -> Path:
+        """Sort CSV files to dest using external merge sort:
+        every file is split to sorted runs, then all runs are merged.
+        Runs are merged in order of files, so sorting stays stable.
+        With a few workers, files are split to segments that are parsed in parallel.
+        If sorting is resumable, finished runs and merges are taken from the manifest of the job.
+
+        :raise CSVHeaderMismatchError: if files have different headers
+        """
+        header = self._check_headers(sources)
+        self._manifest = self._start_job(sources, dest) if self._resume else None
+        try:
+            runs = None if self._manifest is None else self._manifest.runs()
+            if self._manifest is None or self._manifest.merge is None:
+                with self._pool() as executor:
+                    segments = self._split(sources, executor)
+                    if len(sources) == 1 and not runs and self._segments_are_sorted(segments, header, executor):
+                        if self._dest_pattern is not None:
+                            with self._phase(Phase.WRITE, dest), self._open(sources[0]) as file:
+                                self._write_shards(csv.DictReader(file), header)
+                        elif not dest.exists() or not dest.samefile(sources[0]):
+                            with self._replace(dest) as path:
+                                shutil.copyfile(sources[0], path)
+                        self._finish_job([])
+                        return dest
+
+                    if executor is not None and len(segments) > 1:
+                        runs = self._generate_runs_in_parallel(segments, header, executor)
+                    else:
+                        runs = self._generate_segments_runs(segments, header)
+            self._merge_runs(runs, dest, header)
+        finally:
+            self._manifest = None
+        return dest
+
+    def _start_job(self, sources: Sequence[Path], dest: Path) -> checkpoint.Manifest:
+        """Load the manifest of interrupted sorting or start a new one.
+        Temporary files of the job that are not recorded in the manifest are deleted."""
+        job_id = checkpoint.job_id(sources, dest)
+        self._run_prefix = f'diskcsvsort-{job_id}-'
+        job = checkpoint.describe_job(
+            sources,
+            dest=str(dest),
+            reverse=self._reverse,
+            encoding=self._encoding,
+            key=self._key_sample(sources[0]),
+        )
+
+        path = self._workdir / f'diskcsvsort-{job_id}.json'
+        manifest = checkpoint.Manifest.load(path)
+        if manifest is not None and (manifest.job != job or not all(run.exists() for run in manifest.runs())):
+            logger.debug('Manifest %s is stale, sorting is started again', path)
+            manifest = None
+        if manifest is None:
+            manifest = checkpoint.Manifest(path=path, job=job)
+            manifest.save()
+        else:
+            logger.debug('Sorting is resumed from manifest %s', path)
+
+        runs = set(manifest.runs())
+        orphans = chain(
+            self._workdir.glob(f'{self._run_prefix}*'),
+            # temporary files of dest or its shards
+            dest.parent.glob(f'.*.{self._run_prefix}*.tmp'),
+        )
+        for orphan in orphans:
+            if orphan not in runs:
+                orphan.unlink(missing_ok=True)
+        for run in runs:
+            self._disk.track(run)
+        return manifest
+
+    def _key_sample(self, src: Path) -> str:
+        """Key of the first row, so a job is not resumed with another key"""
+        with self._open(src) as file:
+            row = next(csv.DictReader(file), None)
+        return '' if row is None else repr(self._key(row))
+
+    def _finish_job(self, runs: Iterable[Path]) -> NoReturn:
+        """Forget the job and delete its runs"""
+        if self._manifest is not None:
+            self._manifest.delete()
+        self._delete_runs(runs)
+
+    def is_sorted(self) -> bool:
+        """Check if source CSV files are sorted one after another.
+        With a few workers, files are split to segments that are checked in parallel.
+
+        :raise CSVHeaderMismatchError: if files have different headers
+        """
+        header = self._check_headers(self._sources)
+        with self._pool() as executor:
+            return self._segments_are_sorted(self._split(self._sources, executor), header, executor)
+
+    @contextmanager
+    def _pool(self) -> Iterator['ProcessPoolExecutor | None']:
+        """Pool of worker processes if there are a few workers"""
+        if self._workers == 1:
+            yield None
+            return
+
+        # multiprocessing is imported only when it is needed, it takes a while
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=self._workers)
+        try:
+            yield executor
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+    def _worker(self) -> 'CSVSort':
+        """Copy of CSVSort for worker process. Every worker gets its share of memory_limit.
+        Disk space is reserved for all segments by the main process, every task may take the rest of disk_limit,
+        so it does not fail if runs fit to the limit in total."""
+        worker = CSVSort(
+            src=self._src,
+            key=self._key,
+            workdir=self._workdir,
+            memory_limit=self._memory_limit / self._workers,
+            reverse=self._reverse,
+            encoding=self._encoding,
+            disk_limit=None if self._disk.limit is None else self._disk.limit - self._disk.current,
+            resume=self._resume,
+        )
+        worker._compress = self._compress
+        worker._compression_ratio = self._compression_ratio
+        worker._run_prefix = self._run_prefix
+        return worker
+
+    def _check_headers(self, sources: Sequence[Path]) -> list[str]:
+        """Read header of CSV files and check that it is the same
+
+        :raise CSVHeaderMismatchError: if files have different headers
+        """
+        header = self._read_header(sources[0])
+        for src in sources[1:]:
+            src_header = self._read_header(src)
+            if src_header != header:
+                raise errors.CSVHeaderMismatchError(src, expected=header, actual=src_header)
+        return header
+
+    def _read_header(self, src: Path) -> list[str]:
+        """Read header of CSV file
+
+        :raise CSVFileEmptyError: if CSV file is empty
+        """
+        with self._open(src) as file:
+            try:
+                return next(csv.reader(file))
+            except StopIteration:
+                raise errors.CSVFileEmptyError(src)
+
+    def _split(self, sources: Sequence[Path], executor: 'ProcessPoolExecutor | None') -> list[Segment]:
+        """Split CSV files to segments for workers.
+        Resumable sorting splits big files even for one worker, so finished segments are its checkpoints.
+        Compressed files are not split."""
+        if (executor is None and not self._resume) or not chunks.is_splittable(self._encoding):
+            return [Segment(src) for src in sources]
+
+        segments = []
+        for src in sources:
+            if src.suffix == '.gz':
+                segments.append(Segment(src))
+                continue
+
+            count = self._workers
+            if self._resume:
+                count = max(count, -(-src.stat().st_size // self._checkpoint_size))
+            segments.extend(chunks.split_csv(
+                src,
+                count=count,
+                encoding=self._encoding,
+                min_size=min(self._min_segment_size, self._checkpoint_size),
+                map_=map if executor is None else executor.map,
+            ))
+        return segments
+
+    @contextmanager
+    def _read_segment(self, segment: Segment, header: Sequence[str]) -> Iterator[csv.DictReader]:
+        """
+        :raise CSVFileEmptyError: if CSV file is empty
+        """
+        if segment.start is None:
+            with self._open(segment.path) as file:
+                reader = csv.DictReader(file)
+                if reader.fieldnames is None:
+                    raise errors.CSVFileEmptyError(segment.path)
+                yield reader
+        else:
+            with chunks.open_segment(segment, self._encoding) as lines:
+                yield csv.DictReader(lines, fieldnames=header)
+
+    def _segments_are_sorted(
+        self,
+        segments: Sequence[Segment],
+        header: Sequence[str],
+        executor: 'ProcessPoolExecutor | None',
+    ) -> bool:
+        """Check if segments are sorted one after another.
+        Every segment is checked alone, then keys on boundaries of segments are compared."""
+        operator_ = operator.ge if self._reverse else operator.le
+        with self._phase(Phase.PROBE, segments[0].path if segments else self._src):
+            if executor is None:
+                # caches of key are counted in this process
+                results = ((self._check_segment(segment, header), {}) for segment in segments)
+            else:
+                worker = self._worker()
+                results = executor.map(
+                    _check_segment_in_worker,
+                    [worker] * len(segments),
+                    segments,
+                    [header] * len(segments),
+                )
+
+            last_key, has_rows = None, False
+            for segment, ((is_sorted, first_key, segment_last_key, rows), key_cache) in zip(segments, results):
+                self._count(rows=rows, bytes_read=segment.size)
+                self._stats.add_key_cache(key_cache)
+                if not is_sorted:
+                    return False
+                if not rows:
+                    continue
+                if has_rows and not operator_(last_key, first_key):
+                    return False
+                last_key, has_rows = segment_last_key, True
+        return True
+
+    def _check_segment(self, segment: Segment, header: Sequence[str]) -> tuple[bool, Any, Any, int]:
+        """Check if segment is sorted
+
+        :return: whether segment is sorted, keys of its first and last checked rows, count of checked rows
+        """
+        operator_ = operator.ge if self._reverse else operator.le
+        first_key = last_key = None
+        rows = 0
+        with self._read_segment(segment, header) as reader:
+            for rows, row in enumerate(reader, start=1):
+                row_key = self._key(row)
+                if rows == 1:
+                    first_key = row_key
+                elif not operator_(last_key, row_key):
+                    return False, first_key, last_key, rows
+                last_key = row_key
+        return True, first_key, last_key, rows
+
+    def _generate_runs(self, segment: Segment, header: Sequence[str]) -> list[Path]:
+        """Split segment of CSV file to runs: sorted temporary files that fit to memory_limit
+
+        :raise CSVFileEmptyError: if CSV file is empty
+        :raise CSVSortError: if one row take more memory than memory limit
+        """
+        runs: list[Path] = []
+        with self._phase(Phase.RUNS, segment.path), self._read_segment(segment, header) as reader:
+            self._reserve_runs(segment.path, size=segment.size)
+            try:
+                for batch in self._batches(reader):
+                    batch.sort(key=self._key, reverse=self._reverse)
+                    runs.append(self._write_run(batch, header=header))
+                    self._count(rows=len(batch))
+            except BaseException:
+                self._delete_runs(runs)
+                raise
+
+            self._count(
+                bytes_read=segment.size,
+                bytes_written=sum(run.stat().st_size for run in runs),
+                runs=len(runs),
+            )
+        return runs
+
+    def _generate_segments_runs(self, segments: Sequence[Segment], header: Sequence[str]) -> list[Path]:
+        """Split segments of CSV files to runs one by one. Runs of all segments are reserved at first,
+        so runs of all segments are compressed if they do not fit plain."""
+        pending = [segment for segment in segments if self._finished_runs(segment) is None]
+        if len(pending) > 1:
+            self._reserve_runs(pending[0].path, size=sum(segment.size for segment in pending))
+        runs: list[Path] = []
+        try:
+            for segment in segments:
+                segment_runs = self._finished_runs(segment)
+                if segment_runs is None:
+                    segment_runs = self._generate_runs(segment, header)
+                    self._finish_runs(segment, segment_runs)
+                runs.extend(segment_runs)
+        except BaseException:
+            if self._manifest is None:
+                self._delete_runs(runs)
+            raise
+        return runs
+
+    def _generate_runs_in_parallel(
+        self,
+        segments: Sequence[Segment],
+        header: Sequence[str],
+        executor: 'ProcessPoolExecutor',
+    ) -> list[Path]:
+        """Split segments of CSV files to runs by worker processes.
+        Runs of all segments are reserved before they are submitted, so compression of runs
+        is chosen by the whole size of segments, not by a segment that a worker gets."""
+        pending = [segment for segment in segments if self._finished_runs(segment) is None]
+        if pending:
+            self._reserve_runs(pending[0].path, size=sum(segment.size for segment in pending))
+        worker = self._worker()
+        runs: list[Path] = []
+        futures = {
+            segment: executor.submit(_generate_runs_in_worker, worker, segment, header)
+            for segment in pending
+        }
+        try:
+            # runs are collected in order of segments, so sorting stays stable
+            for segment in segments:
+                if segment not in futures:
+                    runs.extend(self._finished_runs(segment))
+                    continue
+
+                segment_runs, events, key_cache = futures[segment].result()
+                self._stats.add_key_cache(key_cache)
+                for run in segment_runs:
+                    self._disk.track(run)
+                self._finish_runs(segment, segment_runs)
+                runs.extend(segment_runs)
+                for event in events:
+                    if event.stage == Stage.END:
+                        self._record(event)
+                    else:
+                        self._emit(event)
+        except BaseException:
+            executor.shutdown(cancel_futures=True)
+            for segment, future in futures.items():
+                if not future.cancelled() and future.exception() is None:
+                    if self._manifest is None:
+                        self._delete_runs(future.result()[0])
+                    else:
+                        self._finish_runs(segment, future.result()[0])
+            raise
+        return runs
+
+    def _finished_runs(self, segment: Segment) -> list[Path] | None:
+        """Runs of segment that are recorded in the manifest. None if segment is not finished"""
+        return None if self._manifest is None else self._manifest.segment_runs(segment)
+
+    def _finish_runs(self, segment: Segment, runs: Sequence[Path]) -> NoReturn:
+        """Record finished runs of segment in the manifest"""
+        if self._manifest is not None:
+            self._manifest.add_segment(segment, runs)
+
+    def _batches(self, reader: Iterable[_ROW]) -> Iterator[list[_ROW]]:
+        """Split rows to batches that fit to memory_limit
+
+        :raise CSVSortError: if one row take more memory than memory limit
+        """
+        batch: list[_ROW] = []
+        memory_usage = 0
+        for i, row in enumerate(reader):
+            row_memory_usage = sys.getsizeof(row)
+            if row_memory_usage > self._memory_limit:
+                raise errors.CSVSortError(f'Row #{i} use memory {row_memory_usage}'
+                                          f'more than memory_limit: {self._memory_limit}')
+            if memory_usage + row_memory_usage > self._memory_limit:
+                yield batch
+                batch, memory_usage = [], 0
+            batch.append(row)
+            memory_usage += row_memory_usage
+        if batch:
+            yield batch
+
+    def _write_run(self, rows: Iterable[_ROW], header: Sequence[str]) -> Path:
+        """Save rows to a new temporary file"""
+        with get_path_tempfile(
+            suffix='.csv.gz' if self._compress else '.csv',
+            prefix=self._run_prefix,
+            directory=self._workdir,
+            delete=False,
+        ) as path_tempfile:
+            self._disk.track(path_tempfile)
+            self._save_csv(rows, filepath=path_tempfile, header=header)
+            self._disk.update(path_tempfile)
+            if self._resume:
+                checkpoint.fsync(path_tempfile)
+        return path_tempfile
+
+    def _delete_runs(self, runs: Iterable[Path]) -> NoReturn:
+        """Delete runs, then reclaim their space. It does not raise DiskLimitError,
+        so all runs are deleted by cleanup after errors."""
+        runs = list(runs)
+        for run in runs:
+            run.unlink(missing_ok=True)
+        for run in runs:
+            self._disk.forget(run)
+
+    def _merge_runs(self, runs: Sequence[Path], dest: Path, header: Sequence[str]) -> NoReturn:
+        """Merge sorted runs to dest and delete them.
+        If there are more runs than _merge_fan_in, neighbour runs are merged to bigger runs first.
+        Every merge is recorded in the manifest before its runs are deleted."""
+        runs = list(runs)
+        if self._manifest is not None:
+            # runs of segments that are not in the current split, e.g. workers were changed
+            stale_runs = set(self._manifest.runs()).difference(runs)
+            self._manifest.set_merge(runs)
+            self._delete_runs(stale_runs)
+        try:
+            self._depth += 1
+            try:
+                i = 0
+                while len(runs) > self._merge_fan_in:
+                    if len(runs) - i < 2:
+                        i = 0
+                    group = runs[i:i + self._merge_fan_in]
+                    runs[i:i + len(group)] = [self._merge_runs_to_run(group, header)]
+                    if self._manifest is not None:
+                        self._manifest.set_merge(runs)
+                    self._delete_runs(group)
+                    i += 1
+            finally:
+                self._depth -= 1
+
+            with self._phase(Phase.MERGE, dest):
+                if self._dest_pattern is None:
+                    with self._replace(dest) as path:
+                        self._merge_sorted(runs, path, header, index=self._index)
+                else:
+                    self._merge_to_shards(runs, header)
+        except BaseException:
+            if self._manifest is None:
+                self._delete_runs(runs)
+            raise
+        self._finish_job(runs)
+
+    def _merge_runs_to_run(self, runs: list[Path], header: Sequence[str]) -> Path:
+        """Merge runs to a new run. Runs are deleted after merge, so space of the new run is reserved before it.
+
+        :raise DiskLimitError: if the new run does not fit to the disk limit
+        """
+        self._disk.reserve(sum(run.stat().st_size for run in runs), what=f'Merging of {len(runs)} runs')
+        with get_path_tempfile(
+            suffix='.csv.gz' if self._compress else '.csv',
+            prefix=self._run_prefix,
+            directory=self._workdir,
+            delete=False,
+        ) as path_tempfile:
+            self._disk.track(path_tempfile)
+            try:
+                with self._phase(Phase.MERGE, path_tempfile):
+                    self._merge_sorted(runs, path_tempfile, header)
+            except BaseException:
+                self._delete_runs([path_tempfile])
+                raise
+            if self._resume:
+                checkpoint.fsync(path_tempfile)
+        return path_tempfile
+
+    def _merge_sorted(
+        self,
+        runs: Sequence[Path],
+        dest: Path,
+        header: Sequence[str],
+        index: KeyIndex | None = None,
+    ) -> NoReturn:
+        """K-way merge of sorted runs. Equal rows are taken from runs in their order
+
+        :param index: index of dest that is filled while rows are written
+        """
+        bytes_read = sum(run.stat().st_size for run in runs)
+        with ExitStack() as stack:
+            readers = [csv.DictReader(stack.enter_context(self._open(run))) for run in runs]
+            dst_file = stack.enter_context(self._open(dest, 'w'))
+            writer = csv.DictWriter(dst_file, fieldnames=header)
+            writer.writeheader()
+            merged = heapq.merge(*readers, key=self._key, reverse=self._reverse)
+            if index is None:
+                rows = 0
+                for rows, row in enumerate(merged, start=1):
+                    writer.writerow(row)
+            else:
+                rows = index.writerows(dst_file, writer, merged, key=self._key)
+        self._disk.update(dest)
+        self._count(rows=rows, bytes_read=bytes_read, bytes_written=dest.stat().st_size)
+
+    def _merge_to_shards(self, runs: Sequence[Path], header: Sequence[str]) -> NoReturn:
+        """K-way merge of sorted runs to shards of dest_pattern"""
+        bytes_read = sum(run.stat().st_size for run in runs)
+        with ExitStack() as stack:
+            readers = [csv.DictReader(stack.enter_context(self._open(run))) for run in runs]
+            rows = self._write_shards(heapq.merge(*readers, key=self._key, reverse=self._reverse), header)
+        self._count(rows=rows, bytes_read=bytes_read, bytes_written=sum(shard.bytes for shard in self._shards))
+
+    def _write_shards(self, rows: Iterable[_ROW], header: Sequence[str]) -> int:
+        """Write sorted rows to shards of dest_pattern
+
+        :return: count of rows
+        """
+        writer = ShardWriter(
+            self._dest_pattern,
+            header,
+            key=self._key,
+            encoding=self._encoding,
+            reverse=self._reverse,
+            size=self._split_size,
+            split_key=self._split_key,
+            index_every=self._index_every,
+            describe=getattr(self._key, 'describe', None),
+            manifest=self._shards_manifest,
+            durable=self._resume,
+            temp_prefix=self._run_prefix or '',
+        )
+        with writer:
+            count = writer.writerows(rows)
+        self._shards = writer.shards
+        return count
+
+    def _save_csv(
+        self,
+        rows: Iterable[_ROW],
+        filepath: Path,
+        header: Sequence[str],
+        index: KeyIndex | None = None,
+    ) -> NoReturn:
+        """Save rows to CSV file
+
+        :param index: index of CSV file that is filled while rows are written
+        """
+        with self._open(filepath, 'w') as file:
             writer = csv.DictWriter(file, fieldnames=header)
             writer.writeheader()
-            writer.writerows(rows)
+            if index is None:
+                writer.writerows(rows)
+            else:
+                index.writerows(file, writer, rows, key=self._key)
+
+
+def _generate_runs_in_worker(
+    csvsort: CSVSort,
+    segment: Segment,
+    header: Sequence[str],
+) -> tuple[list[Path], list[PhaseEvent], dict[str, CacheStats]]:
+    """Split segment of CSV file to runs in worker process.
+    Events and counters of key caches are returned to the main process"""
+    events: list[PhaseEvent] = []
+    csvsort._on_event = events.append
+    return csvsort._generate_runs(segment, header), events, csvsort._key_cache()
+
+
+def _check_segment_in_worker(
+    csvsort: CSVSort,
+    segment: Segment,
+    header: Sequence[str],
+) -> tuple[tuple[bool, Any, Any, int], dict[str, CacheStats]]:
+    return csvsort._check_segment(segment, header), csvsort._key_cache()
@@ -0,0 +1,96 @@
+import shutil
+from pathlib import Path
+
+from diskcsvsort import errors
+
+
+class DiskUsage:
+    """Accounting of disk space taken by temporary files in workdir.
+
+    Only files registered via ``track`` are accounted,
+    so the source CSV file may live in workdir too.
+    """
+
+    def __init__(self, workdir: Path, limit: float | None = None):
+        """
+        :param workdir: directory where temporary files are created
+        :param limit: max bytes that temporary files may take at once. Unlimited if None.
+        """
+        self.workdir = workdir
+        self.limit = limit
+        self.written = 0
+        self.reclaimed = 0
+        self.peak = 0
+        self._sizes: dict[Path, int] = {}
+
+    @property
+    def current(self) -> int:
+        """Bytes taken by tracked files right now"""
+        return self.written - self.reclaimed
+
+    @property
+    def available(self) -> float:
+        """Bytes that still can be written: the smallest of the free disk space and the rest of the limit"""
+        free = shutil.disk_usage(self.workdir).free
+        if self.limit is None:
+            return free
+        return min(free, self.limit - self.current)
+
+    def tracks(self, path: Path) -> bool:
+        return path in self._sizes
+
+    def track(self, path: Path) -> None:
+        """Start accounting of the file"""
+        self._sizes.setdefault(path, 0)
+        self.update(path)
+
+    def update(self, path: Path) -> None:
+        """Account current size of the tracked file. Deleted file is reclaimed and forgotten.
+
+        :raise DiskLimitError: if tracked files take more than the limit
+        """
+        self._account(path)
+        if self.limit is not None and self.current > self.limit:
+            raise errors.DiskLimitError(
+                f'Temporary files in {self.workdir} take {self.current} bytes '
+                f'more than disk_limit: {self.limit}'
+            )
+
+    def forget(self, path: Path) -> None:
+        """Reclaim space of the deleted file. The limit is not checked,
+        so cleanup after errors (e.g. DiskLimitError) reclaims all files."""
+        self._account(path)
+
+    def _account(self, path: Path) -> None:
+        if path not in self._sizes:
+            return
+
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            size = None
+
+        delta = (size or 0) - self._sizes[path]
+        if delta > 0:
+            self.written += delta
+        else:
+            self.reclaimed -= delta
+
+        if size is None:
+            del self._sizes[path]
+        else:
+            self._sizes[path] = size
+        self.peak = max(self.peak, self.current)
+
+    def reserve(self, nbytes: float, what: str) -> None:
+        """Check that ``nbytes`` can be written before writing them.
+
+        :raise DiskLimitError: if there is not enough space
+        """
+        available = self.available
+        if nbytes > available:
+            raise errors.DiskLimitError(
+                f'{what} needs ~{int(nbytes)} bytes in {self.workdir}, '
+                f'but only {int(available)} bytes are available '
+                f'(disk_limit: {self.limit}, used: {self.current})'
+            )
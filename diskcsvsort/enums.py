@@ -11,3 +11,25 @@ class StrEnum(str, Enum):
 class OS(StrEnum):
     WINDOWS = 'Windows'
     LINUX = 'Linux'
+
+
+class Phase(StrEnum):
+    PROBE = 'probe'
+    PARTITION = 'partition'
+    RUNS = 'runs'
+    SORT = 'sort'
+    MERGE = 'merge'
+    WRITE = 'write'
+
+
+class Stage(StrEnum):
+    START = 'start'
+    END = 'end'
+
+
+class ColumnOption(StrEnum):
+    ASC = 'asc'
+    DESC = 'desc'
+    NULLS_FIRST = 'nulls_first'
+    NULLS_LAST = 'nulls_last'
+    CACHED = 'cached'
@@ -14,3 +14,19 @@ class CSVFileEmptyError(CSVSortError):
 
     def __str__(self) -> str:
         return f'CSV file is empty: {self.filepath}'
+
+
+class DiskLimitError(CSVSortError):
+    """Exception for case when temporary files do not fit to the disk limit or free disk space"""
+
+
+class CSVHeaderMismatchError(CSVSortError):
+    """Exception for case when CSV files that are sorted together have different headers"""
+
+    def __init__(self, filepath: Path, expected: list[str], actual: list[str]):
+        self.filepath = filepath
+        self.expected = expected
+        self.actual = actual
+
+    def __str__(self) -> str:
+        return f'CSV file has header {self.actual}, expected {self.expected}: {self.filepath}'
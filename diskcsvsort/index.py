@@ -0,0 +1,222 @@
+"""Sparse key index of sorted CSV file.
+
+Index keeps keys of every Nth row and byte offsets of these rows. It is saved near the CSV file
+(``sorted.csv.idx``), so rows of a key range are read by seeking to the nearest indexed row
+before the range instead of reading the whole file.
+
+Index is a JSON file, so loading of index that came with a data directory from elsewhere is safe.
+Keys are JSON values, ``bytes`` and tuples are tagged, e.g. ``{"bytes": "<base64>"}``.
+"""
+import os
+import csv
+import codecs
+import json
+import base64
+import logging
+import dataclasses
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, Optional, TextIO
+
+from diskcsvsort import chunks
+from diskcsvsort.chunks import Segment
+
+_VERSION = 2
+
+logger = logging.getLogger(__name__)
+
+
+def index_path(path: Path) -> Path:
+    """Path of index of CSV file"""
+    return path.with_name(f'{path.name}.idx')
+
+
+@dataclasses.dataclass
+class KeyIndex:
+    every: int
+    reverse: bool = False
+    # count of indexed rows: rows of a few writes are counted together
+    rows: int = 0
+    keys: list = dataclasses.field(default_factory=list)
+    offsets: list[int] = dataclasses.field(default_factory=list)
+
+    def writerows(self, file: TextIO, writer: Any, rows: Iterable, key: Callable[[Any], Any]) -> int:
+        """Write rows by CSV writer. Keys of every Nth row and offsets of these rows in file are indexed.
+
+        :return: count of rows
+        """
+        start = self.rows
+        for row in rows:
+            self.add(row, file.tell, key=key)
+            writer.writerow(row)
+        return self.rows - start
+
+    def add(self, row: Any, offset: int | Callable[[], int], key: Callable[[Any], Any]) -> None:
+        """Count row that starts at offset. Key and offset are indexed for every Nth row.
+
+        :param offset: offset of row or function that returns it, it is called for indexed rows only
+        """
+        if self.rows % self.every == 0:
+            self.keys.append(key(row))
+            self.offsets.append(offset() if callable(offset) else offset)
+        self.rows += 1
+
+    def build(self, path: Path, key: Callable[[dict], Any], encoding: str = 'utf-8') -> None:
+        """Index CSV file that is already written"""
+        header, header_end = chunks.read_header(path, encoding)
+        with path.open('rb') as file:
+            lines = _OffsetLines(file, header_end, encoding)
+            reader = csv.DictReader(lines, fieldnames=header)
+            while True:
+                offset = lines.offset
+                row = next(reader, None)
+                if row is None:
+                    break
+                self.add(row, offset, key=key)
+
+    def save(self, path: Path) -> None:
+        """Save index of CSV file near it. Index is bound to the size and modification time of the file.
+        Index is not saved (and the old one is deleted) if keys are not JSON values, bytes or tuples of them."""
+        stat = path.stat()
+        try:
+            keys = [_encode_key(key) for key in self.keys]
+        except TypeError as err:
+            logger.warning('Index of %s is not saved: %s', path, err)
+            index_path(path).unlink(missing_ok=True)
+            return
+
+        data = dataclasses.asdict(self) | {
+            'keys': keys,
+            'version': _VERSION,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+        }
+        temp_path = index_path(path).with_suffix('.idx.tmp')
+        with temp_path.open('w', encoding='utf-8') as file:
+            json.dump(data, file)
+        os.replace(temp_path, index_path(path))
+
+    @classmethod
+    def load(cls, path: Path) -> Optional['KeyIndex']:
+        """Load index of CSV file. None if there is no index, it is broken
+        or CSV file was changed after indexing."""
+        try:
+            data = json.loads(index_path(path).read_text(encoding='utf-8'))
+            stat = path.stat()
+            version, size, mtime_ns = data.pop('version'), data.pop('size'), data.pop('mtime_ns')
+            if version != _VERSION or (size, mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+                return None
+            data['keys'] = [_decode_key(key) for key in data['keys']]
+            return cls(**data)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return None
+
+    def seek(self, before: Callable[[Any], bool]) -> int | None:
+        """Offset of the last indexed row that is before the range.
+        None if the range may start at the first row.
+
+        :param before: whether key is before the range. It is true for a few first keys only.
+        """
+        low, high = 0, len(self.keys)
+        while low < high:
+            middle = (low + high) // 2
+            if before(self.keys[middle]):
+                low = middle + 1
+            else:
+                high = middle
+        return self.offsets[low - 1] if low else None
+
+
+def read_range(
+    path: Path,
+    key: Callable[[dict], Any],
+    start: Any = None,
+    stop: Any = None,
+    encoding: str = 'utf-8',
+) -> Iterator[dict]:
+    """Read rows of sorted CSV file which keys are in range ``start <= key < stop``.
+    Reading starts from the nearest indexed row before the range, the whole file is read
+    if there is no index or the file was changed after indexing.
+
+    :param path: sorted CSV file
+    :param key: sorting key function, the same as for sorting of the file
+    :param start: the first key of range. Range is not limited from the start if it is None.
+    :param stop: key after range. Range is not limited from the end if it is None.
+    :param encoding: encoding of CSV file
+    """
+    def in_range(row_key: Any) -> bool:
+        return (start is None or row_key >= start) and (stop is None or row_key < stop)
+
+    index = KeyIndex.load(path)
+    if index is None:
+        with path.open(encoding=encoding, newline='') as file:
+            yield from (row for row in csv.DictReader(file) if in_range(key(row)))
+        return
+
+    if index.reverse:
+        def before(row_key: Any) -> bool:
+            return stop is not None and row_key >= stop
+    else:
+        def before(row_key: Any) -> bool:
+            return start is not None and row_key < start
+
+    header, header_end = chunks.read_header(path, encoding)
+    offset = index.seek(before)
+    segment = Segment(path=path, start=header_end if offset is None else offset, end=path.stat().st_size)
+    with chunks.open_segment(segment, encoding) as lines:
+        for row in csv.DictReader(lines, fieldnames=header):
+            row_key = key(row)
+            if before(row_key):
+                continue
+            if not in_range(row_key):
+                return
+            yield row
+
+
+def _encode_key(key: Any) -> Any:
+    """JSON value of key: bytes and tuples are tagged by dicts
+
+    :raise TypeError: if key is not JSON value, bytes or tuple of them
+    """
+    if isinstance(key, bytes):
+        return {'bytes': base64.b64encode(key).decode('ascii')}
+    if isinstance(key, tuple):
+        return {'tuple': [_encode_key(item) for item in key]}
+    if isinstance(key, list):
+        return [_encode_key(item) for item in key]
+    if key is None or isinstance(key, (str, int, float)):
+        return key
+    raise TypeError(f'key {key!r} of type {type(key).__name__} is not supported')
+
+
+def _decode_key(value: Any) -> Any:
+    if isinstance(value, dict):
+        [(tag, item)] = value.items()
+        if tag == 'bytes':
+            return base64.b64decode(item, validate=True)
+        if tag == 'tuple':
+            return tuple(_decode_key(i) for i in item)
+        raise ValueError(f'Unknown tag of key: {tag}')
+    if isinstance(value, list):
+        return [_decode_key(item) for item in value]
+    return value
+
+
+class _OffsetLines:
+    """Lines of CSV file for ``csv.reader``. Offset is the offset of the next line,
+    so it is the offset of the next record between records."""
+
+    def __init__(self, file: BinaryIO, offset: int, encoding: str):
+        self.offset = offset
+        self._file = file
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        file.seek(offset)
+
+    def __iter__(self) -> '_OffsetLines':
+        return self
+
+    def __next__(self) -> str:
+        line = self._file.readline()
+        if not line:
+            raise StopIteration
+        self.offset += len(line)
+        return self._decoder.decode(line)
@@ -3,7 +3,7 @@ from typing import Any, Optional
 
 class InfAny:
     """InfAny always bigger than another object during the comparison.
-    Like math.inf but for any object."""
+    Like math.inf but for any object. InfAny is equal only to itself."""
 
     _pos_inst: Optional['InfAny'] = None
     _neg_inst: Optional['InfAny'] = None
@@ -26,19 +26,22 @@ class InfAny:
         return f'{sign}{type(self).__name__}'
 
     def __gt__(self, other: Any):
-        return not self._is_negative
+        return not self._is_negative and self is not other
 
     def __lt__(self, other: Any):
-        return self._is_negative
+        return self._is_negative and self is not other
 
     def __ge__(self, other: Any):
-        return not self._is_negative
+        return not self._is_negative or self is other
 
     def __le__(self, other: Any):
-        return self._is_negative
+        return self._is_negative or self is other
 
     def __eq__(self, other: Any):
-        return False
+        return self is other
+
+    def __hash__(self):
+        return id(self)
 
     def __neg__(self) -> 'InfAny':
         return InfAny(is_negative=not self._is_negative)
@@ -0,0 +1,244 @@
+"""Sorted output split to shard files.
+
+Sorted rows are written to shards in order (``sorted-0000.csv``, ``sorted-0001.csv``, ...).
+A new shard is started when the current one would exceed the size limit or when the split key
+of rows changes, so shards of split key have non-overlapping key ranges. Every shard has the header,
+it is written to a temporary file near it and renamed when it is complete.
+Manifest lists shards with counts of rows and their min/max keys.
+"""
+import os
+import csv
+import json
+import codecs
+import shutil
+import dataclasses
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Iterable, Sequence
+
+from diskcsvsort import checkpoint
+from diskcsvsort.index import KeyIndex, index_path
+from diskcsvsort.temp import get_path_tempfile
+
+
+def shard_path(pattern: str, number: int) -> Path:
+    """Path of shard by pattern with shard number, e.g. 'sorted-{n:04d}.csv'"""
+    return Path(pattern.format(n=number))
+
+
+def check_pattern(pattern: str) -> None:
+    """:raise ValueError: if shard paths of pattern are not distinct"""
+    try:
+        paths = {shard_path(pattern, 0), shard_path(pattern, 1)}
+    except (KeyError, IndexError, ValueError) as err:
+        raise ValueError(f'Wrong dest_pattern {pattern}: {err!r}')
+    if len(paths) == 1:
+        raise ValueError(f'dest_pattern has no shard number, e.g. "sorted-{{n:04d}}.csv": {pattern}')
+
+
+@dataclasses.dataclass
+class Shard:
+    path: Path
+    rows: int = 0
+    bytes: int = 0
+    # JSON serializable keys of the first and the last rows in order of keys
+    min_key: Any = None
+    max_key: Any = None
+
+
+class ShardWriter:
+    """Writer of sorted rows to rolling shards. Shards of the previous sorting that are left
+    after the last shard are deleted on close, so shards of pattern are the sorted data only."""
+
+    def __init__(
+        self,
+        pattern: str,
+        header: Sequence[str],
+        *,
+        key: Callable[[dict], Any],
+        encoding: str = 'utf-8',
+        reverse: bool = False,
+        size: float | None = None,
+        split_key: Callable[[dict], Any] | None = None,
+        index_every: int | None = None,
+        describe: Callable[[dict], Any] | None = None,
+        manifest: Path | None = None,
+        durable: bool = False,
+        temp_prefix: str = '',
+    ):
+        """
+        :param pattern: pattern of shard paths with shard number, e.g. 'sorted-{n:04d}.csv'
+        :param header: header of CSV files
+        :param key: sorting key function
+        :param encoding: encoding of CSV files
+        :param reverse: whether rows are in reversed order of keys
+        :param size: max bytes of shard. Shard with one row may be bigger.
+        :param split_key: function of row, a new shard is started when its value changes
+        :param index_every: save sparse key index of every shard, see ``KeyIndex``
+        :param describe: JSON serializable key of row for manifest. Key itself by default, or its repr
+         if it is not serializable.
+        :param manifest: path of JSON manifest of shards. It is not saved if it is None.
+        :param durable: flush shards to the disk before they are renamed
+        :param temp_prefix: prefix of names of temporary files after '.<shard name>.'
+        """
+        self.shards: list[Shard] = []
+        self._pattern = pattern
+        self._key = key
+        self._encoding = encoding
+        self._reverse = reverse
+        self._size = size
+        self._split_key = split_key
+        self._index_every = index_every
+        self._describe = describe or self._describe_key
+        self._manifest = manifest
+        self._durable = durable
+        self._temp_prefix = temp_prefix
+
+        self._line = _Line()
+        self._writer = csv.DictWriter(self._line, fieldnames=header)
+        self._file: BinaryIO | None = None
+        self._temp_path: Path | None = None
+        self._encode: Callable[[str], bytes] | None = None
+        self._index: KeyIndex | None = None
+        self._split_value: Any = None
+        self._first_row: dict | None = None
+        self._last_row: dict | None = None
+
+    def __enter__(self) -> 'ShardWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def writerows(self, rows: Iterable[dict]) -> int:
+        """Write rows to shards
+
+        :return: count of rows
+        """
+        count = 0
+        for count, row in enumerate(rows, start=1):
+            self._writer.writerow(row)
+            line = self._line.value
+            data = self._encode(line) if self._file is not None else None
+            split_value = self._split_key(row) if self._split_key is not None else None
+            if self._file is None or self._is_full(data, split_value):
+                self._start_shard()
+                data = self._encode(line)
+            self._split_value = split_value
+
+            shard = self.shards[-1]
+            if self._index is not None:
+                self._index.add(row, shard.bytes, key=self._key)
+            if self._first_row is None:
+                self._first_row = row
+            self._last_row = row
+            self._file.write(data)
+            shard.rows += 1
+            shard.bytes += len(data)
+        return count
+
+    def close(self) -> None:
+        """Finish the last shard, delete shards of the previous sorting and save manifest.
+        There is one shard with header only if there were no rows."""
+        if self._file is None:
+            self._start_shard()
+        self._finish_shard()
+
+        number = len(self.shards)
+        while (path := shard_path(self._pattern, number)).exists():
+            path.unlink()
+            index_path(path).unlink(missing_ok=True)
+            number += 1
+
+        if self._manifest is not None:
+            self._save_manifest()
+
+    def abort(self) -> None:
+        """Delete the shard that is not finished"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._temp_path.unlink(missing_ok=True)
+
+    def _is_full(self, data: bytes, split_value: Any) -> bool:
+        if self._split_key is not None and split_value != self._split_value:
+            return True
+        return self._size is not None and self.shards[-1].bytes + len(data) > self._size
+
+    def _start_shard(self) -> None:
+        if self._file is not None:
+            self._finish_shard()
+
+        path = shard_path(self._pattern, len(self.shards))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with get_path_tempfile(
+            directory=path.parent,
+            prefix=f'.{path.name}.{self._temp_prefix}',
+            suffix='.tmp',
+            delete=False,
+        ) as temp_path:
+            self._temp_path = temp_path
+        self._file = temp_path.open('wb')
+        # incremental encoder writes BOM of encodings like utf-8-sig once per file
+        self._encode = codecs.getincrementalencoder(self._encoding)().encode
+        self._index = None if self._index_every is None else KeyIndex(every=self._index_every, reverse=self._reverse)
+        self._first_row = self._last_row = None
+
+        self._writer.writeheader()
+        header = self._encode(self._line.value)
+        self._file.write(header)
+        self.shards.append(Shard(path=path, bytes=len(header)))
+
+    def _finish_shard(self) -> None:
+        shard = self.shards[-1]
+        self._file.flush()
+        if self._durable:
+            os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        if shard.path.exists():
+            shutil.copymode(shard.path, self._temp_path)
+        os.replace(self._temp_path, shard.path)
+        if self._index is not None:
+            self._index.save(shard.path)
+
+        if self._first_row is not None:
+            first, last = self._describe(self._first_row), self._describe(self._last_row)
+            shard.min_key, shard.max_key = (last, first) if self._reverse else (first, last)
+
+    def _save_manifest(self) -> None:
+        data = {
+            'shards': [
+                dataclasses.asdict(shard) | {'path': str(shard.path)}
+                for shard in self.shards
+            ],
+        }
+        temp_path = self._manifest.with_name(f'{self._manifest.name}.tmp')
+        with temp_path.open('w', encoding='utf-8') as file:
+            json.dump(data, file, indent=2)
+            if self._durable:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(temp_path, self._manifest)
+        if self._durable:
+            checkpoint.fsync(self._manifest.parent)
+
+    def _describe_key(self, row: dict) -> Any:
+        key = self._key(row)
+        try:
+            json.dumps(key)
+        except (TypeError, ValueError):
+            return repr(key)
+        return key
+
+
+class _Line:
+    """File for CSV writer that keeps the last written line"""
+
+    value = ''
+
+    def write(self, value: str) -> int:
+        self.value = value
+        return len(value)
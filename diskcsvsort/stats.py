@@ -0,0 +1,112 @@
+"""Instrumentation of sorting: phase events and summary stats"""
+import dataclasses
+from pathlib import Path
+from typing import Any
+
+from diskcsvsort.enums import Phase, Stage
+
+
+@dataclasses.dataclass
+class PhaseEvent:
+    """Start or end of sorting phase of one file.
+    Counters are filled on the end of phase."""
+    phase: Phase
+    path: Path
+    depth: int
+    stage: Stage = Stage.START
+    rows: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    runs: int = 0
+    temp_bytes: int = 0
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+
+    def __str__(self) -> str:
+        text = f'{self.phase.value} {self.stage.value}: {self.path} (depth {self.depth})'
+        if self.stage == Stage.END:
+            text += (
+                f', rows {self.rows}, read {self.bytes_read} B, written {self.bytes_written} B'
+                f', runs {self.runs}, temp {self.temp_bytes} B'
+                f', wall {self.wall_time:.3f} s, cpu {self.cpu_time:.3f} s'
+            )
+        return text
+
+
+@dataclasses.dataclass
+class PhaseStats:
+    """Totals of one phase over all files"""
+    count: int = 0
+    rows: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+
+    def add(self, event: PhaseEvent) -> None:
+        self.count += 1
+        self.rows += event.rows
+        self.bytes_read += event.bytes_read
+        self.bytes_written += event.bytes_written
+        self.wall_time += event.wall_time
+        self.cpu_time += event.cpu_time
+
+
+@dataclasses.dataclass
+class CacheStats:
+    """Counters of memoizing cache of key converter"""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def add(self, other: 'CacheStats') -> None:
+        self.hits += other.hits
+        self.misses += other.misses
+        self.evictions += other.evictions
+
+    def __sub__(self, other: 'CacheStats') -> 'CacheStats':
+        return CacheStats(
+            hits=self.hits - other.hits,
+            misses=self.misses - other.misses,
+            evictions=self.evictions - other.evictions,
+        )
+
+
+@dataclasses.dataclass
+class SortStats:
+    """Summary of sorting returned by CSVSort.apply"""
+    rows: int = 0
+    bytes: int = 0
+    runs: int = 0
+    max_depth: int = 0
+    # count of shards of dest_pattern
+    shards: int = 0
+    temp_bytes_written: int = 0
+    temp_bytes_peak: int = 0
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    phases: dict[Phase, PhaseStats] = dataclasses.field(default_factory=dict)
+    # caches of key converters by name, if key has them (see CSVSort key)
+    key_cache: dict[str, CacheStats] = dataclasses.field(default_factory=dict)
+
+    def add(self, event: PhaseEvent) -> None:
+        self.runs += event.runs
+        self.max_depth = max(self.max_depth, event.depth)
+        self.phases.setdefault(event.phase, PhaseStats()).add(event)
+
+    def add_key_cache(self, key_cache: dict[str, CacheStats]) -> None:
+        for name, cache_stats in key_cache.items():
+            self.key_cache.setdefault(name, CacheStats()).add(cache_stats)
+
+    def to_dict(self) -> dict[str, Any]:
+        """JSON serializable representation"""
+        data = dataclasses.asdict(self)
+        data['phases'] = {phase.value: stats for phase, stats in data['phases'].items()}
+        for name, cache_stats in self.key_cache.items():
+            data['key_cache'][name]['hit_rate'] = cache_stats.hit_rate
+        return data
@@ -13,6 +13,7 @@ def get_path_tempfile(
     directory: Path | None = None,
     delete: bool = True,
     suffix: str = '',
+    prefix: str | None = None,
 ) -> ContextManager[Path]:
     """Create temporary file and return path of its.
 
@@ -20,16 +21,17 @@ def get_path_tempfile(
      OS temporary directory by default.
     :param delete: whether to delete the file after closing of context
     :param suffix: suffix of filename
+    :param prefix: prefix of filename
     """
     temp_dir = directory if directory else Path(tempfile.gettempdir())
     temp_dir.mkdir(parents=True, exist_ok=True)
 
     if platform.system() == OS.WINDOWS:
         filename = os.urandom(24).hex()
-        filepath = temp_dir / f'{filename}{suffix}'
+        filepath = temp_dir / f'{prefix or ""}{filename}{suffix}'
         filepath.touch(exist_ok=True)
     else:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=temp_dir) as file:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, prefix=prefix, dir=temp_dir) as file:
             filepath = Path(file.name)
 
     try:
@@ -1,12 +1,14 @@
 import csv
+import json
 import random
 from pathlib import Path
 
+import pytest
 import typer
 from typer.testing import CliRunner
 
 from tests.conftest import assert_sorted_csv
-from diskcsvsort.cli import cli_run
+from diskcsvsort.cli import cli_run, cli_range, cli_batch
 
 
 class TestCSVSortCLI:
@@ -46,3 +48,209 @@ class TestCSVSortCLI:
         result = self.runner.invoke(self.app, [str(tmp_csv), '--by', 'A:int', '--by', 'B:int', '--reverse'])
         assert result.stdout.strip(' \n') == f'CSV file has been sorted: {tmp_csv}'
         assert_sorted_csv(tmp_csv, key=lambda row: (int(row['A']), int(row['B'])), reverse=True)
+
+    def test_sort_disk_limit_exceeded(self, tmp_csv):
+        self._fill_csv(tmp_csv)
+        result = self.runner.invoke(self.app, [str(tmp_csv), '--memory-limit', '1000', '--disk-limit', '10'])
+        assert result.stdout.startswith('Error: ')
+
+    def test_sort_stats_json(self, tmp_csv, tmp_path):
+        self._fill_csv(tmp_csv)
+        stats_path = tmp_path / 'stats.json'
+        result = self.runner.invoke(self.app, [
+            str(tmp_csv), '--by', 'A:int', '--memory-limit', '5000', '--stats-json', str(stats_path),
+        ])
+        assert result.stdout.strip(' \n') == f'CSV file has been sorted: {tmp_csv}'
+        stats = json.loads(stats_path.read_text())
+        assert stats['rows'] == 50
+        assert stats['runs'] > 0
+        assert {'probe', 'partition', 'merge'} <= stats['phases'].keys()
+
+    @pytest.mark.parametrize('workers', (1, 2))
+    def test_sort_cached_column_stats(self, tmp_csv, tmp_path, workers):
+        with tmp_csv.open('w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['day', 'n'])
+            writer.writerows([f'2022-08-{random.randint(1, 3):02d}', i] for i in range(200))
+        stats_path = tmp_path / 'stats.json'
+        result = self.runner.invoke(self.app, [
+            str(tmp_csv), '--by', 'day:date(%Y-%m-%d):cached', '--by', 'n:int',
+            '--stats-json', str(stats_path), '--workers', str(workers),
+        ])
+        assert result.stdout.strip(' \n') == f'CSV file has been sorted: {tmp_csv}'
+        assert_sorted_csv(tmp_csv, key=lambda row: (row['day'], int(row['n'])), reverse=False)
+        stats = json.loads(stats_path.read_text())
+        cache = stats['key_cache']['day']
+        assert cache['misses'] >= 3 and cache['hits'] > 0
+        assert cache['hit_rate'] == cache['hits'] / (cache['hits'] + cache['misses'])
+        assert list(stats['key_cache']) == ['day']
+
+    def test_sort_unparsable_values_first(self, tmp_csv):
+        with tmp_csv.open('w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['A', 'B'])
+            writer.writerows([['5', 'b'], ['x', 'b'], ['-3', 'a'], ['', 'a'], ['5', 'a']])
+        result = self.runner.invoke(self.app, [str(tmp_csv), '--by', 'A:int', '--by', 'B:str'])
+        assert result.stdout.strip(' \n') == f'CSV file has been sorted: {tmp_csv}'
+        with tmp_csv.open(encoding='utf-8') as file:
+            rows = [tuple(row.values()) for row in csv.DictReader(file)]
+        assert rows == [('', 'a'), ('x', 'b'), ('-3', 'a'), ('5', 'a'), ('5', 'b')]
+
+    def test_sort_by_columns_mixed_directions(self, tmp_csv):
+        self._fill_csv(tmp_csv)
+        result = self.runner.invoke(self.app, [str(tmp_csv), '--by', 'A:int:desc', '--by', 'B:int'])
+        assert result.stdout.strip(' \n') == f'CSV file has been sorted: {tmp_csv}'
+        assert_sorted_csv(tmp_csv, key=lambda row: (-int(row['A']), int(row['B'])), reverse=False)
+
+    def test_sort_by_time_with_colons(self, tmp_csv):
+        with tmp_csv.open('w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['T'])
+            writer.writerows([['12:00:01'], ['08:30:00'], ['23:59:59'], ['bad']])
+        result = self.runner.invoke(self.app, [str(tmp_csv), '--by', 'T:time(%H:%M:%S):desc:nulls_first'])
+        assert result.stdout.strip(' \n') == f'CSV file has been sorted: {tmp_csv}'
+        with tmp_csv.open(encoding='utf-8') as file:
+            assert [row['T'] for row in csv.DictReader(file)] == ['bad', '23:59:59', '12:00:01', '08:30:00']
+
+    def test_sort_by_column_without_type(self, tmp_csv):
+        self._fill_csv(tmp_csv)
+        result = self.runner.invoke(self.app, [str(tmp_csv), '--by', 'A'])
+        assert result.stdout.startswith('Error: ')
+
+    def test_sort_glob_to_dest(self, tmp_path):
+        for i in range(3):
+            self._fill_csv(tmp_path / f'part-{i}.csv')
+        dest = tmp_path / 'sorted.csv'
+        result = self.runner.invoke(self.app, [
+            str(tmp_path / 'part-*.csv'), '--dest', str(dest), '--by', 'A:int', '--workers', '2',
+        ])
+        assert result.stdout.strip(' \n') == f'CSV file has been sorted: {dest}'
+        assert_sorted_csv(dest, key=lambda row: int(row['A']), reverse=False)
+        with dest.open(encoding='utf-8') as file:
+            assert len(list(csv.DictReader(file))) == 150
+
+    def test_sort_few_files_without_dest(self, tmp_path):
+        for i in range(2):
+            self._fill_csv(tmp_path / f'part-{i}.csv')
+        result = self.runner.invoke(self.app, [str(tmp_path / 'part-0.csv'), str(tmp_path / 'part-1.csv')])
+        assert result.stdout.startswith('Error: ')
+
+    def test_sort_not_existing_file(self, tmp_path):
+        result = self.runner.invoke(self.app, [str(tmp_path / 'part-*.csv')])
+        assert result.stdout.startswith('Error: No such file')
+
+    def test_check(self, tmp_csv):
+        self._fill_csv(tmp_csv)
+        args = [str(tmp_csv), '--by', 'A:int', '--check', '--workers', '2']
+        result = self.runner.invoke(self.app, args)
+        assert result.stdout.strip(' \n') == f'CSV file is not sorted: {tmp_csv}'
+        assert result.exit_code == 1
+
+        self.runner.invoke(self.app, [str(tmp_csv), '--by', 'A:int'])
+        result = self.runner.invoke(self.app, args)
+        assert result.stdout.strip(' \n') == f'CSV file is sorted: {tmp_csv}'
+        assert result.exit_code == 0
+
+    def test_sort_resume(self, tmp_csv, tmp_path):
+        self._fill_csv(tmp_csv)
+        workdir = tmp_path / 'workdir'
+        result = self.runner.invoke(self.app, [
+            str(tmp_csv), '--by', 'A:int', '--resume', '--workdir', str(workdir), '--memory-limit', '2000',
+        ])
+        assert result.stdout.strip(' \n') == f'CSV file has been sorted: {tmp_csv}'
+        assert_sorted_csv(tmp_csv, key=lambda row: int(row['A']), reverse=False)
+        assert not any(workdir.iterdir())
+
+    def test_sort_to_shards(self, tmp_csv, tmp_path):
+        self._fill_csv(tmp_csv)
+        original = tmp_csv.read_text()
+        pattern = str(tmp_path / 'part-{n:02d}.csv')
+        manifest = tmp_path / 'shards.json'
+        result = self.runner.invoke(self.app, [
+            str(tmp_csv), '--by', 'A:int', '--by', 'B:int', '--dest-pattern', pattern,
+            '--split-by-key', 'A', '--split-by-size', '200', '--shards-manifest', str(manifest),
+        ])
+        assert result.stdout.strip(' \n') == f'CSV file has been sorted: {pattern}'
+        assert tmp_csv.read_text() == original
+
+        shards = json.loads(manifest.read_text())['shards']
+        rows = []
+        for shard in shards:
+            with open(shard['path'], encoding='utf-8', newline='') as file:
+                shard_rows = list(csv.DictReader(file))
+            assert len({row['A'] for row in shard_rows}) == 1
+            assert shard['min_key'] == {'A': shard_rows[0]['A'], 'B': shard_rows[0]['B']}
+            assert shard['max_key'] == {'A': shard_rows[-1]['A'], 'B': shard_rows[-1]['B']}
+            rows.extend(shard_rows)
+        with tmp_csv.open(encoding='utf-8', newline='') as file:
+            assert rows == sorted(csv.DictReader(file), key=lambda row: (int(row['A']), int(row['B'])))
+
+        result = self.runner.invoke(self.app, [
+            str(tmp_csv), '--by', 'A:int', '--by', 'B:int', '--dest-pattern', pattern, '--split-by-key', 'B',
+        ])
+        assert result.stdout.strip(' \n') == 'Error: Split columns have to be the first columns of sorting: B'
+
+        for split_by_key in ('Z', 'B'):
+            result = self.runner.invoke(self.app, [
+                str(tmp_csv), '--dest-pattern', pattern, '--split-by-key', split_by_key,
+            ])
+            assert result.stdout.strip(' \n') == f'Error: Split columns have to be the first columns of sorting: {split_by_key}'
+
+        result = self.runner.invoke(self.app, [
+            str(tmp_csv), '--dest-pattern', pattern, '--split-by-key', 'A', '--split-by-key', 'B',
+            '--shards-manifest', str(manifest),
+        ])
+        assert result.exit_code == 0
+        shards = json.loads(manifest.read_text())['shards']
+        assert all(shard['min_key'].keys() == {'A', 'B', 'C'} for shard in shards)
+
+    def test_range(self, tmp_csv, tmp_path):
+        self._fill_csv(tmp_csv)
+        result = self.runner.invoke(self.app, [str(tmp_csv), '--by', 'A:int:desc', '--by', 'B:int', '--index-every', '4'])
+        assert result.exit_code == 0
+        assert Path(f'{tmp_csv}.idx').exists()
+
+        app = typer.Typer()
+        app.command()(cli_range)
+        output = tmp_path / 'range.csv'
+        result = self.runner.invoke(app, [
+            str(tmp_csv), '--by', 'A:int:desc', '--by', 'B:int',
+            '--start', '80', '--stop', '20', '--output', str(output),
+        ])
+        assert result.exit_code == 0
+        with tmp_csv.open(encoding='utf-8') as file:
+            expected = [row for row in csv.DictReader(file) if 20 < int(row['A']) <= 80]
+        with output.open(encoding='utf-8') as file:
+            assert list(csv.DictReader(file)) == expected
+
+        result = self.runner.invoke(app, [str(tmp_csv), '--by', 'A:int:desc', '--start', '80', '--stop', 'x'])
+        assert result.exit_code == 1
+        assert result.stdout.startswith('Error: Range value')
+
+    def test_batch(self, tmp_path):
+        paths = []
+        for i in range(3):
+            paths.append(tmp_path / f'part-{i}.csv')
+            self._fill_csv(paths[-1])
+        (tmp_path / 'empty.csv').write_text('', encoding='utf-8')
+        files = tmp_path / 'files.txt'
+        files.write_text(f'{paths[2]}\n\n{tmp_path / "empty.csv"}\n', encoding='utf-8')
+
+        app = typer.Typer()
+        app.command()(cli_batch)
+        result = self.runner.invoke(app, [
+            str(paths[0]), str(paths[1]), '--from-list', str(files), '--by', 'A:int', '--workers', '2',
+        ])
+        lines = result.stdout.strip(' \n').splitlines()
+        assert lines[0].startswith(f'Error: {tmp_path / "empty.csv"}')
+        assert lines[1] == 'CSV files have been sorted: 3 of 4'
+        assert result.exit_code == 1
+        for path in paths:
+            assert_sorted_csv(path, key=lambda row: int(row['A']), reverse=False)
+
+    def test_batch_without_files(self):
+        app = typer.Typer()
+        app.command()(cli_batch)
+        result = self.runner.invoke(app, ['--by', 'A:int'])
+        assert result.stdout.startswith('Error: There are no CSV files')
+        assert result.exit_code == 1
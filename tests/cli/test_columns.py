@@ -1,8 +1,11 @@
+import pickle
+import random
 import datetime as dt
 
 import pytest
 
 from diskcsvsort.cli import columns
+from diskcsvsort.stats import CacheStats
 
 
 class TestColumns:
@@ -61,3 +64,129 @@ class TestColumns:
         column = columns.get_column(strtype)
         with pytest.raises(ValueError):
             column.to_python(value)
+
+    @pytest.mark.parametrize(['strtype', 'values'], (
+        ('int', ['-1000000000000000000000000000000', '-65536', '-256', '-255', '-1', '0', '1', '7', '255', '256',
+                 '1000000000000000000000000000000']),
+        ('float', ['-inf', '-1e300', '-1.5', '-1e-310', '0', '1e-310', '1.5', '2', '1e300', 'inf', 'nan']),
+        ('str', ['', 'A', 'a', 'a\x00', 'a\x00b', 'a\x01', 'ab', 'b', 'я', '\U0001F600']),
+        ('date(%Y-%m-%d)', ['0001-01-01', '1969-12-31', '1970-01-01', '2022-08-26', '9999-12-31']),
+        ('time(%H:%M:%S.%f)', ['00:00:00.0', '18:05:25.0', '18:05:25.000001', '23:59:59.999999']),
+        ('datetime(%Y-%m-%d %H:%M:%S.%f)', [
+            '0001-01-01 00:00:00.0', '1969-12-31 23:59:59.999999', '1970-01-01 00:00:00.0', '2022-08-26 18:05:25.5',
+        ]),
+        ('datetime(%Y-%m-%d %H:%M:%S%z)', [
+            '2022-08-26 16:05:25+0300', '2022-08-26 14:05:26+0000', '2022-08-26 12:05:27-0200',
+        ]),
+    ))
+    def test_to_bytes_keeps_order(self, strtype, values):
+        column = columns.get_column(strtype)
+        shuffled = random.sample(values, len(values))
+        assert sorted(shuffled, key=column.to_bytes) == values
+
+    def test_to_bytes_negative_zero(self):
+        column = columns.get_column('float')
+        assert column.to_bytes('-0.0') == column.to_bytes('0.0')
+
+    @pytest.mark.parametrize(['strtype', 'value', 'min_value'], (
+        ('int', 'string', '-1000'),
+        ('float', 'string', '-inf'),
+        ('date(%Y-%m-%d)', 'string', '0001-01-01'),
+        ('datetime(%Y-%m-%d %H:%M:%S)', 'string', '0001-01-01 00:00:00'),
+    ))
+    def test_to_bytes_null_is_less(self, strtype, value, min_value):
+        column = columns.get_column(strtype)
+        assert column.to_bytes(value) == columns.NULL_RANK
+        assert column.to_bytes(value) < column.to_bytes(min_value)
+
+    def test_to_bytes_concatenation_keeps_order(self):
+        int_column, str_column = columns.get_column('int'), columns.get_column('str')
+        rows = [(a, b) for a in ('-300', '-1', '0', '1', '300') for b in ('', 'a', 'ab', 'b')]
+        by_bytes = sorted(rows, key=lambda row: int_column.to_bytes(row[0]) + str_column.to_bytes(row[1]))
+        assert by_bytes == sorted(rows, key=lambda row: (int(row[0]), row[1]))
+
+    @pytest.mark.parametrize(['strtype', 'expected'], (
+        ('int', ('int', [])),
+        ('int:desc', ('int', ['desc'])),
+        ('float:asc:nulls_last', ('float', ['asc', 'nulls_last'])),
+        ('time(%H:%M:%S):desc', ('time(%H:%M:%S)', ['desc'])),
+        ('time(%H:%M:%S)', ('time(%H:%M:%S)', [])),
+        ('date(%Y-%m-%d):desc:cached', ('date(%Y-%m-%d)', ['desc', 'cached'])),
+    ))
+    def test_split_options(self, strtype, expected):
+        assert columns.split_options(strtype) == expected
+
+    @pytest.mark.parametrize('strtype', ('int:asc:desc', 'str:nulls_first:nulls_last'))
+    def test_conflicting_options(self, strtype):
+        with pytest.raises(ValueError):
+            columns.get_column(strtype)
+
+    @pytest.mark.parametrize(['strtype', 'values'], (
+        ('int:desc', ['256', '255', '1', '0', '-1', '-255', '-256']),
+        ('float:desc', ['inf', '1.5', '0', '-1.5', '-inf']),
+        ('str:desc', ['b', 'ab', 'a\x01', 'a\x00b', 'a\x00', 'a', '']),
+        ('date(%Y-%m-%d):desc', ['2022-08-26', '1970-01-01', '0001-01-01']),
+    ))
+    def test_to_bytes_descending(self, strtype, values):
+        column = columns.get_column(strtype)
+        shuffled = random.sample(values, len(values))
+        assert sorted(shuffled, key=column.to_bytes) == values
+
+    @pytest.mark.parametrize(['strtype', 'nulls_first'], (
+        ('int', True),
+        ('int:asc', True),
+        ('int:nulls_last', False),
+        ('int:desc', False),
+        ('int:desc:nulls_first', True),
+        ('int:desc:nulls_last', False),
+    ))
+    def test_to_bytes_nulls(self, strtype, nulls_first):
+        column = columns.get_column(strtype)
+        null, values = column.to_bytes('null'), [column.to_bytes(value) for value in ('-1000', '0', '1000')]
+        assert all((null < value) == nulls_first for value in values)
+
+    def test_to_bytes_mixed_directions(self):
+        year, name = columns.get_column('int:desc'), columns.get_column('str')
+        rows = [(a, b) for a in ('-300', '0', '1', '300') for b in ('', 'a', 'ab', 'b')]
+        by_bytes = sorted(rows, key=lambda row: year.to_bytes(row[0]) + name.to_bytes(row[1]))
+        assert by_bytes == sorted(rows, key=lambda row: (-int(row[0]), row[1]))
+
+    def test_cached_column(self, monkeypatch):
+        monkeypatch.setattr(columns.BaseColumn, 'cache_size', 2)
+        column = columns.get_column('date(%Y-%m-%d):desc:cached')
+        assert column.cache_stats() == CacheStats()
+        assert columns.get_column('date(%Y-%m-%d):desc').cache_stats() is None
+
+        values = ['2022-08-26', '2022-08-26', 'null', '2022-08-26', '1970-01-01', '0001-01-01', '2022-08-26']
+        assert [column.converter(value) for value in values] == [column.to_bytes(value) for value in values]
+        assert column.cache_stats() == CacheStats(hits=2, misses=5, evictions=3)
+        assert column.cache_stats().hit_rate == 2 / 7
+
+    def test_columns_key_pickle(self):
+        key = columns.ColumnsKey({'A': columns.get_column('int'), 'B': columns.get_column('date(%Y-%m-%d):cached')})
+        row = {'A': '5', 'B': '2022-08-26'}
+        assert key(row) == key(row)
+        assert key.cache_info() == {'B': CacheStats(hits=1, misses=1)}
+
+        copy = pickle.loads(pickle.dumps(key))
+        assert copy(row) == key(row)
+        assert copy.cache_info() == {'B': CacheStats(misses=1)}
+
+    def test_all_values_key(self):
+        key = columns.AllValuesKey()
+        alphabet = ['', 'a', 'b', '\x00', '\x00\x00', '\x01', 'é', '\U0001f600']
+        rows = [
+            {'A': a + b, 'B': c}
+            for a in alphabet for b in alphabet for c in ('', 'a', '\x00')
+        ]
+        random.shuffle(rows)
+        assert sorted(rows, key=key) == sorted(rows, key=lambda row: tuple(row.values()))
+        assert len({key(row) for row in rows}) == len({tuple(row.values()) for row in rows})
+
+        for row in rows:
+            prefix = key.encode([row['A']])
+            assert all(key(other) >= prefix for other in rows if other['A'] >= row['A'])
+            assert all(key(other) < prefix for other in rows if other['A'] < row['A'])
+
+        assert pickle.loads(pickle.dumps(key))({'A': 'a', 'B': 'b'}) == key({'A': 'a', 'B': 'b'})
+        assert key.describe({'A': 'a', 'B': 'b'}) == {'A': 'a', 'B': 'b'}
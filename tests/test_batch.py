@@ -0,0 +1,69 @@
+import csv
+import random
+from pathlib import Path
+
+import pytest
+
+from diskcsvsort.batch import sort_files
+
+
+def _key(row: dict) -> int:
+    return int(row['A'])
+
+
+class TestSortFiles:
+
+    @staticmethod
+    def _write_files(tmp_path: Path, count: int) -> list[Path]:
+        paths = []
+        for i in range(count):
+            path = tmp_path / f'{i}.csv'
+            with path.open('w', encoding='utf-8', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(['A', 'B'])
+                writer.writerows([random.randint(0, 50), j] for j in range(100))
+            paths.append(path)
+        return paths
+
+    @staticmethod
+    def _read(path: Path) -> list[dict]:
+        with path.open(encoding='utf-8') as file:
+            return list(csv.DictReader(file))
+
+    @pytest.mark.parametrize('workers', (1, 2))
+    def test_sort_files(self, tmp_path, workers):
+        paths = self._write_files(tmp_path, 5)
+        expected = [sorted(self._read(path), key=_key) for path in paths]
+        results = list(sort_files(paths, key=_key, workers=workers, workdir=tmp_path, chunksize=2))
+        assert [result.path for result in results] == paths
+        assert all(result.error is None and result.stats.rows == 100 for result in results)
+        assert [self._read(path) for path in paths] == expected
+
+    def test_sort_files_errors(self, tmp_path):
+        paths = self._write_files(tmp_path, 2)
+        empty = tmp_path / 'empty.csv'
+        empty.write_text('', encoding='utf-8')
+        paths.insert(1, empty)
+
+        results = list(sort_files([*paths, tmp_path / 'missing.csv'], key=_key, workdir=tmp_path))
+        assert [result.error is None for result in results] == [True, False, True, False]
+        assert 'empty' in results[1].error
+        assert [_key(row) for row in self._read(paths[2])] == sorted(_key(row) for row in self._read(paths[2]))
+
+    @pytest.mark.parametrize('workers', (1, 2))
+    def test_sort_files_bad_data(self, tmp_path, workers):
+        paths = self._write_files(tmp_path, 2)
+        latin = tmp_path / 'latin.csv'
+        latin.write_bytes('A,B\n2,caf\xe9\n1,b\n'.encode('latin-1'))
+        no_column = tmp_path / 'no_column.csv'
+        no_column.write_text('B,C\n2,x\n1,y\n', encoding='utf-8')
+        paths[1:1] = [latin, no_column]
+
+        results = list(sort_files(paths, key=_key, workers=workers, workdir=tmp_path, memory_limit=1_000))
+        assert [result.error is None for result in results] == [True, False, False, True]
+        assert results[1].error.startswith('UnicodeDecodeError')
+        assert results[2].error == "KeyError: 'A'"
+        assert no_column.read_text(encoding='utf-8') == 'B,C\n2,x\n1,y\n'
+        for path in (paths[0], paths[3]):
+            assert [_key(row) for row in self._read(path)] == sorted(_key(row) for row in self._read(path))
+        assert sorted(tmp_path.iterdir()) == sorted(paths)
@@ -0,0 +1,59 @@
+import csv
+from pathlib import Path
+
+import pytest
+
+from benchmarks.case import run_api, run_cli
+from benchmarks.generate import Shape, generate_csv, header
+from tests.conftest import assert_sorted_csv
+
+
+class TestGenerateCSV:
+
+    @staticmethod
+    def _read(path: Path) -> list[dict]:
+        with path.open(encoding='utf-8') as file:
+            return list(csv.DictReader(file))
+
+    def test_shape(self, tmp_csv):
+        shape = Shape(rows=500, width=4, cardinality=10, value_size=3)
+        generate_csv(tmp_csv, shape)
+        rows = self._read(tmp_csv)
+        assert len(rows) == 500
+        assert list(rows[0]) == header(shape)
+        assert len({row['key'] for row in rows}) <= 10
+        assert all(len(row['col0']) == 3 for row in rows)
+
+    def test_same_seed(self, tmp_path):
+        shape = Shape(rows=100)
+        generate_csv(tmp_path / 'a.csv', shape, seed=1)
+        generate_csv(tmp_path / 'b.csv', shape, seed=1)
+        generate_csv(tmp_path / 'c.csv', shape, seed=2)
+        assert (tmp_path / 'a.csv').read_text() == (tmp_path / 'b.csv').read_text()
+        assert (tmp_path / 'a.csv').read_text() != (tmp_path / 'c.csv').read_text()
+
+    def test_presorted(self, tmp_csv):
+        generate_csv(tmp_csv, Shape(rows=500, presorted=1.0))
+        assert_sorted_csv(tmp_csv, reverse=False, key=lambda row: int(row['key']))
+
+    @pytest.mark.parametrize('duplicates', (0.0, 0.5))
+    def test_duplicates(self, tmp_csv, duplicates):
+        generate_csv(tmp_csv, Shape(rows=1000, duplicates=duplicates))
+        rows = self._read(tmp_csv)
+        unique = len({tuple(row.values()) for row in rows})
+        assert unique == 1000 if duplicates == 0 else unique < 700
+
+    def test_run_api(self, tmp_csv, tmp_path):
+        generate_csv(tmp_csv, Shape(rows=1000))
+        stats = run_api(tmp_csv, workdir=tmp_path, memory_limit=50_000)
+        assert stats['rows'] == 1000
+        assert stats['runs'] > 0
+        assert_sorted_csv(tmp_csv, reverse=False, key=lambda row: int(row['key']))
+
+    def test_run_cli(self, tmp_csv, tmp_path):
+        generate_csv(tmp_csv, Shape(rows=1000))
+        stats = run_cli(tmp_csv, workdir=tmp_path, memory_limit=50_000)
+        assert stats['rows'] == 1000
+        # process startup, imports and parsing of options are measured too
+        assert stats['wall_time'] > stats['sort_wall_time'] > 0
+        assert_sorted_csv(tmp_csv, reverse=False, key=lambda row: int(row['key']))
@@ -0,0 +1,45 @@
+from pathlib import Path
+
+from diskcsvsort.chunks import Segment
+from diskcsvsort.checkpoint import Manifest, job_id, describe_job
+
+
+class TestManifest:
+
+    def test_save_load(self, tmp_path):
+        path = tmp_path / 'manifest.json'
+        manifest = Manifest(path=path, job={'key': 'a'})
+        manifest.save()
+        manifest.add_segment(Segment(Path('a.csv'), 10, 20), [tmp_path / 'run-1.csv', tmp_path / 'run-2.csv'])
+
+        loaded = Manifest.load(path)
+        assert loaded == manifest
+        assert loaded.segment_runs(Segment(Path('a.csv'), 10, 20)) == [tmp_path / 'run-1.csv', tmp_path / 'run-2.csv']
+        assert loaded.segment_runs(Segment(Path('a.csv'))) is None
+        assert loaded.runs() == [tmp_path / 'run-1.csv', tmp_path / 'run-2.csv']
+        assert [p.name for p in tmp_path.iterdir()] == ['manifest.json']
+
+    def test_set_merge(self, tmp_path):
+        manifest = Manifest(path=tmp_path / 'manifest.json', job={})
+        manifest.add_segment(Segment(Path('a.csv')), [tmp_path / 'run-1.csv'])
+        manifest.set_merge([tmp_path / 'run-2.csv'])
+        loaded = Manifest.load(manifest.path)
+        assert loaded.segments == {}
+        assert loaded.runs() == [tmp_path / 'run-2.csv']
+
+    def test_load_broken(self, tmp_path):
+        path = tmp_path / 'manifest.json'
+        assert Manifest.load(path) is None
+        path.write_text('{"job": {}', encoding='utf-8')
+        assert Manifest.load(path) is None
+
+    def test_job(self, tmp_path):
+        src = tmp_path / 'a.csv'
+        src.write_text('A\n1\n', encoding='utf-8')
+        assert job_id([src], src) == job_id([src], src)
+        assert job_id([src], src) != job_id([src], tmp_path / 'b.csv')
+
+        job = describe_job([src], reverse=False)
+        assert job == describe_job([src], reverse=False)
+        src.write_text('A\n1\n2\n', encoding='utf-8')
+        assert job != describe_job([src], reverse=False)
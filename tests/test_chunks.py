@@ -0,0 +1,80 @@
+import csv
+import random
+
+import pytest
+
+from diskcsvsort import chunks
+
+
+class TestChunks:
+
+    header = ['A', 'B', 'C']
+
+    def _fill_csv(self, path, rows_count: int, lineterminator: str = '\r\n') -> list[list[str]]:
+        values = ['plain', 'with,comma', 'with\nnew line', 'with "quotes"', '"\n"', '', 'multi\n\nlines"\n""']
+        rows = [
+            [random.choice(values) + str(i) for _ in self.header]
+            for i in range(rows_count)
+        ]
+        with path.open('w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file, lineterminator=lineterminator)
+            writer.writerow(self.header)
+            writer.writerows(rows)
+        return rows
+
+    @staticmethod
+    def _read_segments(segments: list[chunks.Segment]) -> list[list[str]]:
+        rows = []
+        for segment in segments:
+            with chunks.open_segment(segment, 'utf-8') as lines:
+                rows.extend(csv.reader(lines))
+        return rows
+
+    @pytest.mark.parametrize('count', (1, 2, 3, 7, 50))
+    @pytest.mark.parametrize('lineterminator', ('\r\n', '\n'))
+    def test_split_csv(self, tmp_csv, count, lineterminator):
+        rows = self._fill_csv(tmp_csv, 200, lineterminator=lineterminator)
+        segments = chunks.split_csv(tmp_csv, count=count, encoding='utf-8')
+        assert 1 <= len(segments) <= count
+        assert self._read_segments(segments) == rows
+        for segment, next_segment in zip(segments, segments[1:]):
+            assert segment.end == next_segment.start
+
+    def test_split_csv_min_size(self, tmp_csv):
+        self._fill_csv(tmp_csv, 200)
+        segments = chunks.split_csv(tmp_csv, count=10, encoding='utf-8', min_size=tmp_csv.stat().st_size // 3)
+        assert len(segments) <= 3
+
+    def test_split_csv_only_header(self, tmp_csv):
+        self._fill_csv(tmp_csv, 0)
+        assert chunks.split_csv(tmp_csv, count=4, encoding='utf-8') == []
+
+    def test_read_header(self, tmp_csv):
+        tmp_csv.write_text('"A\nB",C\n1,2\n', encoding='utf-8')
+        header, header_end = chunks.read_header(tmp_csv, 'utf-8')
+        assert header == ['A\nB', 'C']
+        assert header_end == len('"A\nB",C\n')
+
+    @pytest.mark.parametrize(['offset', 'in_quotes', 'expected'], (
+        (0, False, 4),  # header end
+        (4, False, 4),  # offset is a record start
+        (5, False, 12),
+        (7, True, 12),  # inside "x\ny"
+        (9, True, 12),  # new line inside quotes is skipped
+        (12, False, 12),
+        (13, False, 16),
+        (17, False, 19),  # the last record has no new line
+    ))
+    def test_find_record_start(self, tmp_csv, offset, in_quotes, expected):
+        tmp_csv.write_bytes(b'A,B\n1,"x\ny"\n2,3\n4,5')
+        with tmp_csv.open('rb') as file:
+            assert chunks.find_record_start(file, offset, in_quotes) == expected
+
+    @pytest.mark.parametrize(['encoding', 'result'], (
+        ('utf-8', True),
+        ('UTF8', True),
+        ('latin-1', True),
+        ('utf-16', False),
+    ))
+    def test_is_splittable(self, encoding, result):
+        assert chunks.is_splittable(encoding) == result
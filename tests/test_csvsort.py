@@ -4,14 +4,18 @@ import random
 import operator
 from pathlib import Path
 from unittest import mock
+from contextlib import nullcontext
 from itertools import zip_longest, chain, permutations
 
 import pytest
 
 from tests.conftest import assert_sorted_csv
 from diskcsvsort import CSVSort
+from diskcsvsort.disk import DiskUsage
+from diskcsvsort.enums import Phase, Stage
+from diskcsvsort.infany import infany
 from diskcsvsort.temp import get_path_tempfile
-from diskcsvsort.errors import CSVSortError, CSVFileEmptyError
+from diskcsvsort.errors import CSVSortError, CSVFileEmptyError, DiskLimitError, CSVHeaderMismatchError
 
 
 class TestCSVSort:
@@ -251,13 +255,16 @@ class TestCSVSort:
                 csvsort.apply()
 
     def test_recursion_err(self, tmp_path):
+        src = tmp_path / 'file.csv'
+        src.write_text('A\n1\n', encoding='utf-8')
         csvsort = CSVSort(
-            src=Path('file'),
+            src=src,
             workdir=tmp_path,
             key=lambda x: x,
             memory_limit=1,
         )
         csvsort._disk_sort = mock.MagicMock(side_effect=RecursionError)
+        csvsort._read_rows = mock.MagicMock(return_value=None)
         csvsort._reached_memory_limit = mock.MagicMock(return_value=True)
         csvsort._csv_is_sorted = mock.MagicMock(return_value=None)
         with pytest.raises(CSVSortError):
@@ -275,3 +282,553 @@ class TestCSVSort:
             csvsort._csv_is_sorted = mock.MagicMock(return_value=None)
             with pytest.raises(CSVSortError):
                 csvsort.apply()
+
+    @staticmethod
+    def _disk_sort_rows(count: int) -> list[dict]:
+        return [
+            {'A': str(random.randint(0, 100)), 'B': 'x' * 20}
+            for _ in range(count)
+        ]
+
+    def test_disk_limit(self, tmp_path):
+        workdir = tmp_path / 'workdir'
+        rows = self._disk_sort_rows(1000)
+        memory_usage = sum(sys.getsizeof(row) for row in rows)
+        with get_path_tempfile(suffix='.csv', directory=tmp_path) as filepath:
+            csvsort = CSVSort(
+                src=filepath,
+                workdir=workdir,
+                key=lambda row: int(row['A']),
+                memory_limit=memory_usage / 5,
+            )
+            csvsort._save_csv(rows=rows, filepath=filepath, header=['A', 'B'])
+            csvsort.disk_usage.limit = filepath.stat().st_size * 2
+            csvsort.apply()
+            assert_sorted_csv(filepath, reverse=False, key=lambda row: int(row['A']))
+
+            usage = csvsort.disk_usage
+            assert 0 < usage.peak <= usage.limit
+            assert usage.current == 0
+            assert usage.written == usage.reclaimed
+            assert not any(workdir.iterdir())
+
+    def test_disk_limit_compressed_runs(self, tmp_path):
+        workdir = tmp_path / 'workdir'
+        rows = self._disk_sort_rows(1000)
+        memory_usage = sum(sys.getsizeof(row) for row in rows)
+        with get_path_tempfile(suffix='.csv', directory=tmp_path) as filepath:
+            csvsort = CSVSort(
+                src=filepath,
+                workdir=workdir,
+                key=lambda row: int(row['A']),
+                memory_limit=memory_usage / 5,
+            )
+            csvsort._save_csv(rows=rows, filepath=filepath, header=['A', 'B'])
+            csvsort.disk_usage.limit = filepath.stat().st_size / 2
+            csvsort.apply()
+            assert_sorted_csv(filepath, reverse=False, key=lambda row: int(row['A']))
+            assert csvsort._compress
+            assert csvsort.disk_usage.peak <= csvsort.disk_usage.limit
+            assert not any(workdir.iterdir())
+
+    def test_disk_limit_exceeded(self, tmp_path):
+        workdir = tmp_path / 'workdir'
+        rows = self._disk_sort_rows(1000)
+        with get_path_tempfile(suffix='.csv', directory=tmp_path) as filepath:
+            csvsort = CSVSort(
+                src=filepath,
+                workdir=workdir,
+                key=lambda row: int(row['A']),
+                memory_limit=1000,
+                disk_limit=100,
+            )
+            csvsort._save_csv(rows=rows, filepath=filepath, header=['A', 'B'])
+            original = filepath.read_text()
+            with pytest.raises(DiskLimitError):
+                csvsort.apply()
+            assert filepath.read_text() == original
+            assert not any(workdir.iterdir())
+
+    @pytest.mark.parametrize('extra, reserve', ((5, False), (2_000, True)))
+    def test_disk_limit_exceeded_after_reservation(self, tmp_path, extra, reserve):
+        # runs are not reserved (like a wrong estimate of compressed size) or runs of deeper levels exceed the limit
+        workdir = tmp_path / 'workdir'
+        rows = self._disk_sort_rows(3000)
+        with get_path_tempfile(suffix='.csv', directory=tmp_path) as filepath:
+            csvsort = CSVSort(
+                src=filepath,
+                workdir=workdir,
+                key=lambda row: int(row['A']),
+                memory_limit=20_000,
+            )
+            csvsort._save_csv(rows=rows, filepath=filepath, header=['A', 'B'])
+            csvsort._disk.limit = filepath.stat().st_size + extra
+            original = filepath.read_text()
+            reservation = nullcontext() if reserve else mock.patch.object(CSVSort, '_reserve_runs')
+            with pytest.raises(DiskLimitError), reservation:
+                csvsort.apply()
+            assert filepath.read_text() == original
+            assert not any(workdir.iterdir())
+            assert csvsort.disk_usage.current == 0
+
+    @pytest.mark.parametrize('ratio', (0.6, 0.8, 1.0, 1.2, 1.5))
+    def test_disk_limit_is_not_exceeded(self, tmp_path, ratio):
+        # merge of runs to the run of upper level reserves space before writing
+        workdir = tmp_path / 'workdir'
+        rows = self._disk_sort_rows(3000)
+        with get_path_tempfile(suffix='.csv', directory=tmp_path) as filepath:
+            csvsort = CSVSort(src=filepath, workdir=workdir, key=lambda row: int(row['A']), memory_limit=20_000)
+            csvsort._save_csv(rows=rows, filepath=filepath, header=['A', 'B'])
+            csvsort._disk.limit = filepath.stat().st_size * ratio
+            try:
+                csvsort.apply()
+            except DiskLimitError:
+                assert not any(workdir.iterdir())
+            else:
+                assert_sorted_csv(filepath, key=lambda row: int(row['A']), reverse=False)
+            assert csvsort.disk_usage.peak <= csvsort._disk.limit
+
+    def test_merge_reserves_space(self, tmp_path):
+        csvsort = CSVSort(src=tmp_path / 'data.csv', workdir=tmp_path, key=lambda row: int(row['A']))
+        runs = []
+        for name in ('less', 'equal', 'dest'):
+            path = tmp_path / f'{name}.csv'
+            csvsort._save_csv(self._disk_sort_rows(100) if name != 'dest' else [], filepath=path, header=['A', 'B'])
+            csvsort._disk.track(path)
+            runs.append(path)
+        less, equal, dest = runs
+        # the first run fits, the second one fits only after the first one is deleted
+        csvsort._disk.limit = csvsort.disk_usage.current + max(less.stat().st_size, equal.stat().st_size)
+        csvsort._merge_csvs(dest, less, equal, delete=True)
+        assert not less.exists() and not equal.exists()
+        assert csvsort.disk_usage.peak <= csvsort._disk.limit
+
+        csvsort._save_csv(self._disk_sort_rows(100), filepath=less, header=['A', 'B'])
+        csvsort._disk.track(less)
+        csvsort._disk.limit = csvsort.disk_usage.current + less.stat().st_size // 2
+        with pytest.raises(DiskLimitError, match='Merging'):
+            csvsort._merge_csvs(dest, less, delete=True)
+        assert dest.stat().st_size == 0
+        assert csvsort.disk_usage.peak <= csvsort._disk.limit
+
+    def test_sort_events(self, tmp_path):
+        rows = self._disk_sort_rows(1000)
+        memory_usage = sum(sys.getsizeof(row) for row in rows)
+        events = []
+        with get_path_tempfile(suffix='.csv', directory=tmp_path) as filepath:
+            csvsort = CSVSort(
+                src=filepath,
+                workdir=tmp_path,
+                key=lambda row: int(row['A']),
+                memory_limit=memory_usage / 5,
+                on_event=events.append,
+            )
+            csvsort._save_csv(rows=rows, filepath=filepath, header=['A', 'B'])
+            stats = csvsort.apply()
+
+        starts = [event for event in events if event.stage == Stage.START]
+        ends = [event for event in events if event.stage == Stage.END]
+        assert len(starts) == len(ends)
+        assert events[0].phase == Phase.PROBE and events[0].depth == 0
+        assert events[-1].phase == Phase.MERGE and events[-1].depth == 0
+        assert events[-1].rows == 1000
+
+        assert stats.rows == 1000
+        assert stats.bytes == events[-1].bytes_written
+        assert stats.runs == sum(event.runs for event in ends)
+        assert stats.max_depth > 0
+        assert stats.temp_bytes_peak > 0
+        assert stats.phases[Phase.PARTITION].rows >= 1000
+        assert stats.phases[Phase.MERGE].count == stats.phases[Phase.PARTITION].count
+
+    @pytest.mark.parametrize('reverse', (False, True))
+    @pytest.mark.parametrize('memory_limit', (1000, 300 * 1024 * 1024))
+    def test_sort_stable(self, reverse, memory_limit, tmp_path):
+        rows = [
+            {'A': str(random.randint(0, 10)), 'N': str(i)}
+            for i in range(1000)
+        ]
+        with get_path_tempfile(suffix='.csv', directory=tmp_path) as filepath:
+            csvsort = CSVSort(
+                src=filepath,
+                workdir=tmp_path,
+                key=lambda row: int(row['A']),
+                reverse=reverse,
+                memory_limit=memory_limit,
+            )
+            csvsort._save_csv(rows=rows, filepath=filepath, header=['A', 'N'])
+            csvsort.apply()
+            assert_sorted_csv(filepath, reverse=reverse, key=lambda row: (int(row['A'])))
+            with filepath.open(encoding='utf-8') as file:
+                sorted_rows = list(csv.DictReader(file))
+
+        assert len(sorted_rows) == len(rows)
+        for pre_row, row in zip(sorted_rows, sorted_rows[1:]):
+            if pre_row['A'] == row['A']:
+                assert int(pre_row['N']) < int(row['N'])
+
+    def test_small_file_read_once(self, tmp_path):
+        rows = self._disk_sort_rows(100)
+        with get_path_tempfile(suffix='.csv', directory=tmp_path) as filepath:
+            csvsort = CSVSort(src=filepath, workdir=tmp_path, key=lambda row: int(row['A']))
+            csvsort._save_csv(rows=rows, filepath=filepath, header=['A', 'B'])
+            with mock.patch.object(csvsort, '_open', wraps=csvsort._open) as open_:
+                csvsort.apply()
+            assert [call.args for call in open_.call_args_list] == [(filepath, ), (mock.ANY, 'w')]
+            assert_sorted_csv(filepath, key=lambda row: int(row['A']), reverse=False)
+
+            # sorted file is read and not written
+            with mock.patch.object(csvsort, '_open', wraps=csvsort._open) as open_:
+                csvsort.apply()
+            assert [call.args for call in open_.call_args_list] == [(filepath, )]
+
+    def test_sort_infany_keys(self, tmp_path):
+        rows = [{'A': random.choice(['x', '1', '2', '3'])} for _ in range(1000)]
+
+        def _key(row: dict):
+            return -infany if row['A'] == 'x' else int(row['A'])
+
+        with get_path_tempfile(suffix='.csv', directory=tmp_path) as filepath:
+            csvsort = CSVSort(
+                src=filepath,
+                workdir=tmp_path,
+                key=_key,
+                memory_limit=1000,
+            )
+            csvsort._save_csv(rows=rows, filepath=filepath, header=['A'])
+            csvsort.apply()
+            assert_sorted_csv(filepath, reverse=False, key=_key)
+
+    def test_sort_incomparable_keys(self, tmp_path):
+        rows = [{'A': random.choice(['nan', '1', '2', '3'])} for _ in range(1000)]
+        with get_path_tempfile(suffix='.csv', directory=tmp_path) as filepath:
+            csvsort = CSVSort(
+                src=filepath,
+                workdir=tmp_path,
+                key=lambda row: float(row['A']),
+                memory_limit=1000,
+            )
+            csvsort._save_csv(rows=rows, filepath=filepath, header=['A'])
+            csvsort.apply()
+            with filepath.open(encoding='utf-8') as file:
+                assert len(list(csv.DictReader(file))) == len(rows)
+
+
+def _shard_key(row: dict) -> int:
+    return int(row['A'])
+
+
+class TestCSVSortSources:
+
+    header = ['A', 'N']
+
+    def _write_shards(self, tmp_path: Path, count: int) -> list[Path]:
+        shards = []
+        for i in range(count):
+            shard = tmp_path / f'part-{i}.csv'
+            with shard.open('w', encoding='utf-8', newline='') as file:
+                writer = csv.DictWriter(file, fieldnames=self.header)
+                writer.writeheader()
+                writer.writerows(
+                    {'A': random.randint(0, 20), 'N': i * 300 + j}
+                    for j in range(300)
+                )
+            shards.append(shard)
+        return shards
+
+    @staticmethod
+    def _read(path: Path) -> list[dict]:
+        with path.open(encoding='utf-8') as file:
+            return list(csv.DictReader(file))
+
+    def _assert_sorted_stable(self, dest: Path, shards: list[Path], reverse: bool = False):
+        rows = self._read(dest)
+        expected = sorted(
+            (row for shard in shards for row in self._read(shard)),
+            key=_shard_key,
+            reverse=reverse,
+        )
+        assert rows == expected
+
+    @pytest.mark.parametrize('workers', (1, 3))
+    @pytest.mark.parametrize('reverse', (False, True))
+    def test_sort_sources(self, tmp_path, workers, reverse):
+        shards = self._write_shards(tmp_path, 5)
+        dest = tmp_path / 'sorted.csv'
+        workdir = tmp_path / 'workdir'
+        csvsort = CSVSort(
+            src=shards,
+            dest=dest,
+            key=_shard_key,
+            workdir=workdir,
+            memory_limit=10_000,
+            reverse=reverse,
+            workers=workers,
+        )
+        stats = csvsort.apply()
+        self._assert_sorted_stable(dest, shards, reverse=reverse)
+        assert stats.rows == 1500
+        assert stats.runs > len(shards)
+        assert stats.phases[Phase.RUNS].count == len(shards)
+        assert not any(workdir.iterdir())
+
+    def test_sort_sources_many_runs(self, tmp_path):
+        shards = self._write_shards(tmp_path, 3)
+        dest = tmp_path / 'sorted.csv'
+        csvsort = CSVSort(src=shards, dest=dest, key=_shard_key, workdir=tmp_path / 'workdir', memory_limit=2_000)
+        csvsort._merge_fan_in = 4
+        csvsort.apply()
+        self._assert_sorted_stable(dest, shards)
+        assert not any((tmp_path / 'workdir').iterdir())
+
+    def test_sort_to_dest(self, tmp_path):
+        [src] = self._write_shards(tmp_path, 1)
+        original = src.read_text()
+        dest = tmp_path / 'sorted.csv'
+        CSVSort(src=src, dest=dest, key=_shard_key, workdir=tmp_path).apply()
+        self._assert_sorted_stable(dest, [src])
+        assert src.read_text() == original
+
+    def test_sort_sources_with_empty_shard(self, tmp_path):
+        shards = self._write_shards(tmp_path, 2)
+        empty = tmp_path / 'empty.csv'
+        empty.write_text('A,N\n', encoding='utf-8')
+        shards.insert(1, empty)
+        dest = tmp_path / 'sorted.csv'
+        CSVSort(src=shards, dest=dest, key=_shard_key, workdir=tmp_path / 'workdir').apply()
+        self._assert_sorted_stable(dest, shards)
+
+    def test_sort_sources_header_mismatch(self, tmp_path):
+        shards = self._write_shards(tmp_path, 2)
+        shards[1].write_text('A,B\n1,2\n', encoding='utf-8')
+        with pytest.raises(CSVHeaderMismatchError):
+            CSVSort(src=shards, dest=tmp_path / 'sorted.csv', key=_shard_key, workdir=tmp_path).apply()
+
+    def test_sort_sources_empty_file(self, tmp_path):
+        shards = self._write_shards(tmp_path, 2)
+        shards[1].write_text('', encoding='utf-8')
+        with pytest.raises(CSVFileEmptyError):
+            CSVSort(src=shards, dest=tmp_path / 'sorted.csv', key=_shard_key, workdir=tmp_path).apply()
+
+    def test_sources_without_dest(self, tmp_path):
+        with pytest.raises(ValueError):
+            CSVSort(src=[tmp_path / 'a.csv', tmp_path / 'b.csv'], key=_shard_key, workdir=tmp_path)
+
+    @pytest.mark.parametrize('reverse', (False, True))
+    def test_sort_segments_in_parallel(self, tmp_path, reverse):
+        [src] = self._write_shards(tmp_path, 1)
+        expected = sorted(self._read(src), key=_shard_key, reverse=reverse)
+        csvsort = CSVSort(
+            src=src,
+            key=_shard_key,
+            workdir=tmp_path / 'workdir',
+            memory_limit=10_000,
+            reverse=reverse,
+            workers=3,
+        )
+        csvsort._min_segment_size = 100
+        stats = csvsort.apply()
+        assert self._read(src) == expected
+        assert stats.phases[Phase.RUNS].count == 3
+        assert not any((tmp_path / 'workdir').iterdir())
+
+    def test_merge_levels_disk_limit(self, tmp_path):
+        # runs fit to the limit, but runs and their merge at the intermediate level do not
+        shards = self._write_shards(tmp_path, 10)
+        dest = tmp_path / 'sorted.csv'
+        workdir = tmp_path / 'workdir'
+        limit = 1.1 * sum(shard.stat().st_size for shard in shards)
+        csvsort = CSVSort(
+            src=shards, dest=dest, key=_shard_key, workdir=workdir, memory_limit=20_000, disk_limit=limit,
+        )
+        with mock.patch.object(CSVSort, '_merge_fan_in', 4), pytest.raises(DiskLimitError, match='Merging'):
+            csvsort.apply()
+        assert csvsort.disk_usage.peak <= limit
+        assert not dest.exists()
+        assert not any(workdir.iterdir())
+
+    @pytest.mark.parametrize('workers', (1, 2))
+    def test_sort_sources_disk_limit(self, tmp_path, workers):
+        # plain runs of all files do not fit to the limit, so they are compressed by every worker
+        shards = self._write_shards(tmp_path, 10)
+        dest = tmp_path / 'sorted.csv'
+        limit = 0.8 * sum(shard.stat().st_size for shard in shards)
+        csvsort = CSVSort(
+            src=shards, dest=dest, key=_shard_key, workers=workers, workdir=tmp_path / 'workdir',
+            memory_limit=20_000, disk_limit=limit,
+        )
+        csvsort.apply()
+        self._assert_sorted_stable(dest, shards)
+        assert csvsort.disk_usage.peak <= limit
+        assert not any((tmp_path / 'workdir').iterdir())
+
+    @pytest.mark.parametrize('workers', (1, 3))
+    def test_is_sorted(self, tmp_path, workers):
+        shards = self._write_shards(tmp_path, 2)
+        csvsort = CSVSort(src=shards, dest=tmp_path / 'sorted.csv', key=_shard_key, workdir=tmp_path, workers=workers)
+        csvsort._min_segment_size = 100
+        assert not csvsort.is_sorted()
+
+        for shard in shards:
+            CSVSort(src=shard, key=_shard_key, workdir=tmp_path).apply()
+        # every file is sorted, but not one after another
+        assert not csvsort.is_sorted()
+
+        csvsort.apply()
+        csvsort = CSVSort(src=tmp_path / 'sorted.csv', key=_shard_key, workdir=tmp_path, workers=workers)
+        csvsort._min_segment_size = 100
+        assert csvsort.is_sorted()
+
+    def test_is_sorted_only_header(self, tmp_path):
+        src = tmp_path / 'empty.csv'
+        src.write_text('A,N\n', encoding='utf-8')
+        assert CSVSort(src=src, key=_shard_key, workdir=tmp_path).is_sorted()
+
+    @staticmethod
+    def _crash_on_merge(count: int):
+        """Patch of merging that works ``count`` times, then fails like the killed process"""
+        merge_sorted = CSVSort._merge_sorted
+        calls = []
+
+        def side_effect(csvsort, *args, **kwargs):
+            calls.append(args)
+            if len(calls) > count:
+                raise KeyboardInterrupt
+            return merge_sorted(csvsort, *args, **kwargs)
+
+        return mock.patch.object(CSVSort, '_merge_sorted', autospec=True, side_effect=side_effect)
+
+    @pytest.mark.parametrize('workers', (1, 3))
+    @pytest.mark.parametrize('merges', (0, 2))
+    def test_resume(self, tmp_path, workers, merges):
+        shards = self._write_shards(tmp_path, 3)
+        dest = tmp_path / 'sorted.csv'
+        workdir = tmp_path / 'workdir'
+
+        def get_csvsort():
+            csvsort = CSVSort(
+                src=shards,
+                dest=dest,
+                key=_shard_key,
+                workdir=workdir,
+                memory_limit=2_000,
+                workers=workers,
+                resume=True,
+            )
+            csvsort._merge_fan_in = 4
+            return csvsort
+
+        with self._crash_on_merge(merges), pytest.raises(KeyboardInterrupt):
+            get_csvsort().apply()
+        assert not dest.exists()
+        assert len(list(workdir.glob('diskcsvsort-*.json'))) == 1
+
+        with mock.patch.object(CSVSort, '_generate_runs', side_effect=AssertionError):
+            get_csvsort().apply()
+        self._assert_sorted_stable(dest, shards)
+        assert not any(workdir.iterdir())
+        assert [path.name for path in tmp_path.iterdir() if path.name.startswith('.')] == []
+
+    def test_resume_segments(self, tmp_path):
+        [src] = self._write_shards(tmp_path, 1)
+        expected = sorted(self._read(src), key=_shard_key)
+        workdir = tmp_path / 'workdir'
+
+        def get_csvsort():
+            csvsort = CSVSort(src=src, key=_shard_key, workdir=workdir, memory_limit=2_000, resume=True)
+            csvsort._checkpoint_size = 500
+            return csvsort
+
+        segments = get_csvsort()._split([src], executor=None)
+        assert len(segments) > 2
+
+        generate_runs = CSVSort._generate_runs
+        calls = []
+
+        def crash_on_third_segment(*args):
+            calls.append(args)
+            if len(calls) == 3:
+                raise KeyboardInterrupt
+            return generate_runs(*args)
+
+        with mock.patch.object(CSVSort, '_generate_runs', autospec=True, side_effect=crash_on_third_segment), \
+                pytest.raises(KeyboardInterrupt):
+            get_csvsort().apply()
+
+        with mock.patch.object(CSVSort, '_generate_runs', autospec=True, side_effect=generate_runs) as mocked:
+            get_csvsort().apply()
+        # the first 2 segments were finished before the crash
+        assert mocked.call_count == len(segments) - 2
+        assert self._read(src) == expected
+        assert not any(workdir.iterdir())
+
+    def test_resume_changed_source(self, tmp_path):
+        shards = self._write_shards(tmp_path, 2)
+        dest = tmp_path / 'sorted.csv'
+        workdir = tmp_path / 'workdir'
+        with self._crash_on_merge(0), pytest.raises(KeyboardInterrupt):
+            CSVSort(src=shards, dest=dest, key=_shard_key, workdir=workdir, memory_limit=2_000, resume=True).apply()
+
+        shards[1].write_text('A,N\n7,x\n3,y\n', encoding='utf-8')
+        CSVSort(src=shards, dest=dest, key=_shard_key, workdir=workdir, memory_limit=2_000, resume=True).apply()
+        self._assert_sorted_stable(dest, shards)
+        assert not any(workdir.iterdir())
+
+    def test_resume_in_place(self, tmp_path):
+        [src] = self._write_shards(tmp_path, 1)
+        original = src.read_text()
+        expected = sorted(self._read(src), key=_shard_key)
+        workdir = tmp_path / 'workdir'
+        with self._crash_on_merge(0), pytest.raises(KeyboardInterrupt):
+            CSVSort(src=src, key=_shard_key, workdir=workdir, memory_limit=2_000, resume=True).apply()
+        assert src.read_text() == original
+
+        CSVSort(src=src, key=_shard_key, workdir=workdir, memory_limit=2_000, resume=True).apply()
+        assert self._read(src) == expected
+        assert not any(workdir.iterdir())
+
+    @pytest.mark.parametrize('workers', (1, 2))
+    def test_in_place_without_copy(self, tmp_path, workers):
+        # source file in workdir: its sorted copy would take the disk space of runs
+        workdir = tmp_path / 'workdir'
+        workdir.mkdir()
+        src = workdir / 'data.csv'
+        rows = [{'A': str(random.randint(0, 100)), 'B': 'x' * 20} for _ in range(3000)]
+        CSVSort(src=src, key=_shard_key, workdir=workdir)._save_csv(rows, filepath=src, header=['A', 'B'])
+        limit = src.stat().st_size * 1.3
+        peaks = []
+        update = DiskUsage.update
+
+        def sample(disk, path):
+            peaks.append(sum(path.stat().st_size for path in workdir.iterdir() if path != src))
+            return update(disk, path)
+
+        csvsort = CSVSort(
+            src=src, key=_shard_key, workdir=workdir, memory_limit=20_000,
+            disk_limit=limit, workers=workers,
+        )
+        with mock.patch.object(DiskUsage, 'update', autospec=True, side_effect=sample):
+            csvsort.apply()
+        assert_sorted_csv(src, key=lambda row: int(row['A']), reverse=False)
+        assert max(peaks) <= limit
+        assert [path.name for path in workdir.iterdir()] == ['data.csv']
+
+    @pytest.mark.skipif(sys.platform == 'win32', reason='symlinks need privileges on Windows')
+    @pytest.mark.parametrize('memory_limit', (1_000, 300 * 1024 * 1024))
+    def test_in_place_through_link(self, tmp_path, memory_limit):
+        [src] = self._write_shards(tmp_path, 1)
+        expected = sorted(self._read(src), key=_shard_key)
+        link = tmp_path / 'link.csv'
+        link.symlink_to(src)
+        CSVSort(src=link, key=_shard_key, workdir=tmp_path / 'workdir', memory_limit=memory_limit).apply()
+        assert link.is_symlink()
+        assert self._read(src) == expected
+
+    def test_interrupted_disk_sort_keeps_src(self, tmp_path):
+        [src] = self._write_shards(tmp_path, 1)
+        original = src.read_text()
+        with mock.patch.object(CSVSort, '_merge_csvs', side_effect=KeyboardInterrupt), \
+                pytest.raises(KeyboardInterrupt):
+            CSVSort(src=src, key=_shard_key, workdir=tmp_path / 'workdir', memory_limit=2_000).apply()
+        assert src.read_text() == original
+        assert sorted(path.name for path in tmp_path.iterdir()) == ['part-0.csv', 'workdir']
@@ -0,0 +1,133 @@
+import csv
+import json
+import pickle
+import random
+from pathlib import Path
+
+import pytest
+
+from diskcsvsort import CSVSort, KeyIndex, read_range
+from diskcsvsort.index import index_path
+
+
+def _key(row: dict) -> int:
+    return int(row['A'])
+
+
+class TestKeyIndex:
+
+    header = ['A', 'B']
+
+    def _write_csv(self, path: Path, count: int = 500):
+        with path.open('w', encoding='utf-8', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=self.header)
+            writer.writeheader()
+            writer.writerows(
+                {'A': random.randint(0, 100), 'B': f'line\n{i}' if i % 7 == 0 else i}
+                for i in range(count)
+            )
+
+    @staticmethod
+    def _read(path: Path) -> list[dict]:
+        with path.open(encoding='utf-8', newline='') as file:
+            return list(csv.DictReader(file))
+
+    @pytest.mark.parametrize('memory_limit', (1_000, 300 * 1024 * 1024))
+    @pytest.mark.parametrize('reverse', (False, True))
+    @pytest.mark.parametrize('workers', (1, 2))
+    def test_sort_with_index(self, tmp_path, memory_limit, reverse, workers):
+        src = tmp_path / 'data.csv'
+        self._write_csv(src)
+        CSVSort(
+            src=src,
+            key=_key,
+            workdir=tmp_path / 'workdir',
+            memory_limit=memory_limit,
+            reverse=reverse,
+            workers=workers,
+            index_every=10,
+        ).apply()
+
+        index = KeyIndex.load(src)
+        assert len(index.offsets) == 50
+        assert index.reverse == reverse
+        rows = self._read(src)
+        with src.open('rb') as file:
+            for key, offset in zip(index.keys, index.offsets):
+                file.seek(offset)
+                assert int(file.readline().split(b',')[0]) == key
+        assert index.keys == [_key(row) for row in rows[::10]]
+
+        for start, stop in ((20, 40), (None, 30), (70, None), (50, 50), (None, None)):
+            expected = [
+                row for row in rows
+                if (start is None or _key(row) >= start) and (stop is None or _key(row) < stop)
+            ]
+            assert list(read_range(src, key=_key, start=start, stop=stop)) == expected
+
+    def test_sorted_file_index(self, tmp_path):
+        src = tmp_path / 'data.csv'
+        self._write_csv(src)
+        CSVSort(src=src, key=_key, workdir=tmp_path).apply()
+        sorted_data = src.read_bytes()
+
+        CSVSort(src=src, key=_key, workdir=tmp_path, index_every=3).apply()
+        assert src.read_bytes() == sorted_data
+        rows = self._read(src)
+        assert KeyIndex.load(src).keys == [_key(row) for row in rows[::3]]
+        assert list(read_range(src, key=_key, start=10, stop=20)) == [row for row in rows if 10 <= _key(row) < 20]
+
+    def test_stale_index(self, tmp_path):
+        src = tmp_path / 'data.csv'
+        self._write_csv(src)
+        CSVSort(src=src, key=_key, workdir=tmp_path, index_every=3).apply()
+        assert index_path(src).exists()
+
+        self._write_csv(src, count=100)
+        CSVSort(src=src, key=_key, workdir=tmp_path).apply()
+        assert KeyIndex.load(src) is None
+        rows = self._read(src)
+        assert list(read_range(src, key=_key, start=10, stop=20)) == [row for row in rows if 10 <= _key(row) < 20]
+
+    def test_keys_of_json_index(self, tmp_path):
+        src = tmp_path / 'data.csv'
+        self._write_csv(src, count=10)
+        keys = [b'\x00\xff', ('a', b'b', 1, 2.5, None), ['c', ('d', )], 'e']
+        KeyIndex(every=1, keys=keys, offsets=[1, 2, 3, 4]).save(src)
+        assert json.loads(index_path(src).read_text())['keys'][0] == {'bytes': 'AP8='}
+        assert KeyIndex.load(src).keys == keys
+
+        KeyIndex(every=1, keys=[object()], offsets=[1]).save(src)
+        assert not index_path(src).exists()
+
+    @pytest.mark.parametrize('content', (
+        b'',
+        b'{"version": 2',
+        b'{"version": 2}',
+        b'[]',
+        pickle.dumps({'version': 1}),
+    ))
+    def test_broken_index(self, tmp_path, content):
+        src = tmp_path / 'data.csv'
+        self._write_csv(src)
+        CSVSort(src=src, key=_key, workdir=tmp_path, index_every=10).apply()
+        data = json.loads(index_path(src).read_text())
+        index_path(src).write_bytes(content)
+        assert KeyIndex.load(src) is None
+        rows = self._read(src)
+        assert list(read_range(src, key=_key, start=10, stop=20)) == [row for row in rows if 10 <= _key(row) < 20]
+
+        data['keys'][1] = {'bytes': '!'}
+        index_path(src).write_text(json.dumps(data))
+        assert KeyIndex.load(src) is None
+
+    def test_seek(self):
+        index = KeyIndex(every=2, keys=[1, 3, 3, 5], offsets=[10, 20, 30, 40])
+        assert index.seek(lambda key: key < 0) is None
+        assert index.seek(lambda key: key < 3) == 10
+        assert index.seek(lambda key: key < 4) == 30
+        assert index.seek(lambda key: key < 9) == 40
+
+    def test_index_every_not_positive(self, tmp_path):
+        with pytest.raises(ValueError):
+            CSVSort(src=tmp_path / 'data.csv', key=_key, workdir=tmp_path, index_every=0)
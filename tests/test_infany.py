@@ -43,3 +43,19 @@ class TestInfAny:
     ))
     def test_negative_infany(self, operator_, value, result):
         assert operator_(-infany, value) == result
+
+    @pytest.mark.parametrize(['operator_', 'result'], (
+        (operator.ge, True),
+        (operator.gt, False),
+        (operator.eq, True),
+        (operator.le, True),
+        (operator.lt, False),
+    ))
+    @pytest.mark.parametrize('value', (infany, -infany))
+    def test_compare_with_itself(self, operator_, result, value):
+        assert operator_(value, value) == result
+
+    def test_compare_positive_with_negative(self):
+        assert -infany < infany
+        assert infany > -infany
+        assert infany != -infany
@@ -0,0 +1,203 @@
+import csv
+import json
+import random
+import operator
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from diskcsvsort import CSVSort, KeyIndex
+from diskcsvsort.shards import ShardWriter, shard_path
+
+
+def _key(row: dict) -> tuple[int, int]:
+    return int(row['A']), int(row['B'])
+
+
+def _day(row: dict) -> int:
+    return int(row['A'])
+
+
+class TestShards:
+
+    header = ['A', 'B']
+
+    def _write_csv(self, path: Path, rows: list[dict]):
+        with path.open('w', encoding='utf-8', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=self.header)
+            writer.writeheader()
+            writer.writerows(rows)
+
+    def _rows(self, count: int = 1000) -> list[dict]:
+        return [{'A': str(random.randint(0, 9)), 'B': str(i)} for i in range(count)]
+
+    @staticmethod
+    def _read(path: Path) -> list[dict]:
+        with path.open(encoding='utf-8', newline='') as file:
+            return list(csv.DictReader(file))
+
+    @pytest.mark.parametrize('reverse', (False, True))
+    @pytest.mark.parametrize('workers', (1, 2))
+    @pytest.mark.parametrize('memory_limit', (1_000, 300 * 1024 * 1024))
+    def test_split_by_size(self, tmp_path, reverse, workers, memory_limit):
+        src = tmp_path / 'data.csv'
+        rows = self._rows()
+        self._write_csv(src, rows)
+        pattern = str(tmp_path / 'out' / 'part-{n:03d}.csv')
+        csvsort = CSVSort(
+            src=src,
+            key=_key,
+            workdir=tmp_path / 'workdir',
+            reverse=reverse,
+            workers=workers,
+            memory_limit=memory_limit,
+            dest_pattern=pattern,
+            split_size=1000,
+            shards_manifest=tmp_path / 'out' / 'manifest.json',
+        )
+        stats = csvsort.apply()
+
+        assert self._read(src) == rows
+        shards = csvsort.shards
+        assert stats.shards == len(shards) > 1
+        assert [shard.path for shard in shards] == [shard_path(pattern, n) for n in range(len(shards))]
+        assert stats.bytes == sum(shard.path.stat().st_size for shard in shards)
+
+        sorted_rows = []
+        for shard in shards:
+            shard_rows = self._read(shard.path)
+            assert shard.path.stat().st_size == shard.bytes <= 1000
+            assert shard.rows == len(shard_rows)
+            keys = sorted(map(_key, shard_rows))
+            assert (shard.min_key, shard.max_key) == (keys[0], keys[-1])
+            sorted_rows.extend(shard_rows)
+        assert sorted_rows == sorted(rows, key=_key, reverse=reverse)
+
+        manifest = json.loads((tmp_path / 'out' / 'manifest.json').read_text())
+        assert [item['path'] for item in manifest['shards']] == [str(shard.path) for shard in shards]
+        assert [item['max_key'] for item in manifest['shards']] == [list(shard.max_key) for shard in shards]
+        assert not list((tmp_path / 'out').glob('.*'))
+
+    def test_split_by_key(self, tmp_path):
+        src = tmp_path / 'data.csv'
+        rows = self._rows()
+        self._write_csv(src, rows)
+        pattern = str(tmp_path / 'part-{n}.csv')
+        csvsort = CSVSort(
+            src=src,
+            key=_key,
+            workdir=tmp_path / 'workdir',
+            memory_limit=2_000,
+            dest_pattern=pattern,
+            split_key=_day,
+            split_size=400,
+            index_every=10,
+        )
+        csvsort.apply()
+
+        days = []
+        for shard in csvsort.shards:
+            shard_rows = self._read(shard.path)
+            assert shard.bytes <= 400
+            assert len({row['A'] for row in shard_rows}) == 1
+            days.append(int(shard_rows[0]['A']))
+            index = KeyIndex.load(shard.path)
+            assert index.keys == [_key(row) for row in shard_rows[::10]]
+        assert days == sorted(days)
+        assert set(days) == {int(row['A']) for row in rows}
+        assert len(days) > len(set(days))
+
+    def test_sorted_src(self, tmp_path):
+        src = tmp_path / 'data.csv'
+        rows = sorted(self._rows(), key=_key)
+        self._write_csv(src, rows)
+        csvsort = CSVSort(
+            src=src,
+            key=_key,
+            workdir=tmp_path / 'workdir',
+            dest_pattern=str(tmp_path / 'part-{n}.csv'),
+            split_key=_day,
+        )
+        csvsort.apply()
+        assert [row for shard in csvsort.shards for row in self._read(shard.path)] == rows
+        assert len(csvsort.shards) == len({row['A'] for row in rows})
+
+    def test_leftover_shards_are_deleted(self, tmp_path):
+        src = tmp_path / 'data.csv'
+        self._write_csv(src, self._rows())
+        pattern = str(tmp_path / 'part-{n}.csv')
+        for split_size, expected in ((1_000, None), (None, 1)):
+            csvsort = CSVSort(src=src, key=_key, workdir=tmp_path, dest_pattern=pattern, split_size=split_size)
+            csvsort.apply()
+            assert len(csvsort.shards) == (expected or len(csvsort.shards))
+        assert sorted(tmp_path.glob('part-*.csv')) == [shard_path(pattern, 0)]
+
+    def test_resume(self, tmp_path):
+        src = tmp_path / 'data.csv'
+        rows = self._rows()
+        self._write_csv(src, rows)
+        workdir = tmp_path / 'workdir'
+        pattern = str(tmp_path / 'out' / 'part-{n}.csv')
+
+        def get_csvsort() -> CSVSort:
+            return CSVSort(
+                src=src, key=_key, workdir=workdir, memory_limit=2_000, resume=True,
+                dest_pattern=pattern, split_size=1_000,
+            )
+
+        def crash(writer, rows):
+            for i, _ in enumerate(rows):
+                if i == 500:
+                    raise KeyboardInterrupt
+            return 0
+
+        with mock.patch.object(ShardWriter, 'writerows', autospec=True, side_effect=crash), \
+                pytest.raises(KeyboardInterrupt):
+            get_csvsort().apply()
+        assert len(list(workdir.glob('diskcsvsort-*.json'))) == 1
+
+        with mock.patch.object(CSVSort, '_generate_runs', side_effect=AssertionError):
+            csvsort = get_csvsort()
+            csvsort.apply()
+        assert [row for shard in csvsort.shards for row in self._read(shard.path)] == sorted(rows, key=_key)
+        assert not any(workdir.iterdir())
+        assert not list((tmp_path / 'out').glob('.*'))
+
+    def test_no_rows(self, tmp_path):
+        path = shard_path(str(tmp_path / 'part-{n}.csv'), 0)
+        with ShardWriter(str(tmp_path / 'part-{n}.csv'), self.header, key=_key, size=10) as writer:
+            assert writer.writerows([]) == 0
+        assert [shard.path for shard in writer.shards] == [path]
+        assert path.read_bytes() == b'A,B\r\n'
+
+    def test_bom_once_per_shard(self, tmp_path):
+        pattern = str(tmp_path / 'part-{n}.csv')
+        with ShardWriter(pattern, self.header, key=_key, split_key=_day, encoding='utf-8-sig') as writer:
+            writer.writerows([{'A': '1', 'B': '1'}, {'A': '2', 'B': '2'}])
+        for shard in writer.shards:
+            assert shard.path.read_bytes().count('﻿'.encode()) == 1
+            assert shard.bytes == shard.path.stat().st_size
+        assert writer.shards[0].min_key == (1, 1)
+
+    def test_error_deletes_unfinished_shard(self, tmp_path):
+        def rows():
+            yield {'A': '1', 'B': '1'}
+            raise KeyboardInterrupt
+
+        with pytest.raises(KeyboardInterrupt):
+            with ShardWriter(str(tmp_path / 'part-{n}.csv'), self.header, key=_key) as writer:
+                writer.writerows(rows())
+        assert list(tmp_path.iterdir()) == []
+
+    @pytest.mark.parametrize('options', (
+        {'dest_pattern': 'part.csv'},
+        {'dest_pattern': 'part-{m}.csv'},
+        {'dest_pattern': 'part-{n}.csv', 'dest': Path('sorted.csv')},
+        {'split_size': 1000},
+        {'split_key': operator.itemgetter('A')},
+        {'dest_pattern': 'part-{n}.csv', 'split_size': 0},
+    ))
+    def test_wrong_options(self, tmp_path, options):
+        with pytest.raises(ValueError):
+            CSVSort(src=tmp_path / 'data.csv', key=_key, workdir=tmp_path, **options)